@@ -0,0 +1,39 @@
+'''
+Reads samples straight out of ZIP / AES-ZIP archives (the password protected zips MalwareBazaar
+serves), so they can be featurized without ever writing the live samples to disk. Members are
+decompressed in memory and, like MappedSample, only their first MAX_BYTES are read.
+'''
+import pyzipper
+
+from config import MAX_BYTES
+
+ARCHIVE_EXTENSIONS = (".zip",)
+DEFAULT_PASSWORD = b"infected"
+# Members that claim to be larger than this are skipped, as a guard against zip bombs
+MAX_MEMBER_SIZE = 512 * 1024 * 1024
+
+
+def is_archive(path):
+    return str(path).lower().endswith(ARCHIVE_EXTENSIONS)
+
+
+def iter_members(source, pwd=DEFAULT_PASSWORD, max_bytes=MAX_BYTES, max_member_size=MAX_MEMBER_SIZE):
+    """
+    Yields (name, data, size, error) for every file in the archive at source (a path or a file-like
+    object). data holds the first max_bytes (None: all) of the decompressed member and size its full
+    size; when a member is skipped or can't be decrypted data is None and error says why.
+    """
+    with pyzipper.AESZipFile(source) as z:
+        for info in z.infolist():
+            if info.is_dir():
+                continue
+            if info.file_size > max_member_size:
+                yield info.filename, None, info.file_size, f"member is {info.file_size} bytes, over the {max_member_size} byte cap"
+                continue
+            try:
+                with z.open(info, pwd=pwd) as f:
+                    data = f.read() if max_bytes is None else f.read(max_bytes)
+            except Exception as e:
+                yield info.filename, None, info.file_size, f"{type(e).__name__}: {e}"
+                continue
+            yield info.filename, data, info.file_size, None
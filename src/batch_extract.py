@@ -0,0 +1,279 @@
+'''
+Batch feature extraction over directories of PE files. Files are fanned out to a process pool
+where each worker builds one PEFeatureExtractor, and results stream into a JSONL (raw features,
+the format train.py reads) or NumPy (lite FEATURE_COLS vectors) sink as they complete. ZIP / AES-ZIP
+archives are featurized member by member in memory, one archive per task.
+
+Usage: python batch_extract.py <out.jsonl|out.npy> <dir or file> [...] [--label 0|1] [--workers N]
+'''
+import os
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+import numpy as np
+
+from config import FEATURE_COLS, MAX_BYTES
+from extractor_pe import PEFeatureExtractor, ExtractionBudget
+from feature_cache import FeatureCache
+from archive_reader import DEFAULT_PASSWORD, is_archive, iter_members
+from sample_reader import MappedSample
+
+MODES = ("raw", "lite")
+
+_extractor = None
+_mode = None
+_max_bytes = MAX_BYTES
+_archive_pwd = DEFAULT_PASSWORD
+
+
+def iter_paths(paths):
+    """Files under the given directories (walked in sorted order) and the given files themselves"""
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, names in os.walk(path):
+                dirs.sort()
+                for name in sorted(names):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def _init_worker(features_file, mode, cache_path=None, max_bytes=MAX_BYTES, budget=None, minimal_parse=False,
+                 archive_pwd=DEFAULT_PASSWORD):
+    global _extractor, _mode, _max_bytes, _archive_pwd
+    # FeatureCache has the same lite_vector/raw_features methods and truncated list as the extractor
+    _extractor = PEFeatureExtractor(features_file, budget=budget, minimal_parse=minimal_parse)
+    if cache_path is not None:
+        _extractor = FeatureCache(cache_path, _extractor, store_raw=mode == "raw")
+    _mode = mode
+    _max_bytes = max_bytes
+    _archive_pwd = archive_pwd
+
+
+def _features(bytez, file_size):
+    # Raw results are JSON encoded here so the parent only has to write them. A raw dict carries the
+    # budget's cuts under "truncated", a lite vector gets them next to it
+    if _mode == "raw":
+        return json.dumps(_extractor.raw_features(bytez, file_size))
+    vector = _extractor.lite_vector(bytez, file_size)
+    return vector, list(_extractor.truncated)
+
+
+def _extract(index, path):
+    """Runs in the worker. Returns (index, [(path, result, error), ...]) with one entry per sample:
+    the file itself, or every member of an archive (named <archive>!<member>)"""
+    if _archive_pwd is not None and is_archive(path):
+        return index, _extract_archive(path)
+    try:
+        with MappedSample(path, _max_bytes) as sample:
+            return index, [(path, _features(sample.data, sample.size), None)]
+    except Exception as e:
+        return index, [(path, None, f"{type(e).__name__}: {e}")]
+
+
+def _extract_archive(path):
+    results = []
+    try:
+        for name, data, size, error in iter_members(path, _archive_pwd, _max_bytes):
+            member_path = f"{path}!{name}"
+            if error is not None:
+                results.append((member_path, None, error))
+                continue
+            try:
+                results.append((member_path, _features(data, size), None))
+            except Exception as e:
+                results.append((member_path, None, f"{type(e).__name__}: {e}"))
+    except Exception as e:
+        results.append((path, None, f"{type(e).__name__}: {e}"))
+    return results
+
+
+class JsonlSink:
+    """One JSON object per file. Raw results get the label and source path added; lite vectors
+    are written as {col: value} over FEATURE_COLS, with the budget's cuts under the truncated key"""
+
+    def __init__(self, out_path, label=None):
+        self.f = open(out_path, "w", encoding="utf8")
+        self.label = label
+
+    def write(self, path, result):
+        if isinstance(result, tuple):
+            vector, truncated = result
+            record = {col: float(v) for col, v in zip(FEATURE_COLS, vector)}
+            record["truncated"] = truncated
+            record["path"] = path
+            if self.label is not None:
+                record["label"] = self.label
+            self.f.write(json.dumps(record) + "\n")
+            return
+        # Splice the extra keys into the worker's encoding instead of decoding it again
+        extra = {"path": path}
+        if self.label is not None:
+            extra["label"] = self.label
+        self.f.write(result[:-1] + ", " + json.dumps(extra)[1:] + "\n")
+
+    def close(self):
+        self.f.close()
+
+
+class NumpySink:
+    """Stacks lite vectors into an (n, len(FEATURE_COLS)) float32 .npy, with the source paths
+    (and labels, if given) written next to it in the same row order. Rows an ExtractionBudget cut
+    short are listed in <stem>.truncated.jsonl with their row number and the cuts"""
+
+    def __init__(self, out_path, label=None):
+        self.out_path = out_path
+        self.label = label
+        self.paths = []
+        self.rows = []
+        self.truncated = []  # (row, cuts)
+
+    def write(self, path, result):
+        if not isinstance(result, tuple):
+            raise ValueError("NumpySink needs lite vectors, run with mode='lite'")
+        vector, truncated = result
+        if truncated:
+            self.truncated.append((len(self.rows), truncated))
+        self.paths.append(path)
+        self.rows.append(vector)
+
+    def close(self):
+        X = np.vstack(self.rows) if self.rows else np.zeros((0, len(FEATURE_COLS)), dtype=np.float32)
+        np.save(self.out_path, X)
+        stem = os.path.splitext(self.out_path)[0]
+        with open(stem + ".paths.txt", "w", encoding="utf8") as f:
+            f.writelines(p + "\n" for p in self.paths)
+        with open(stem + ".truncated.jsonl", "w", encoding="utf8") as f:
+            for row, truncated in self.truncated:
+                f.write(json.dumps({"row": row, "path": self.paths[row], "truncated": truncated}) + "\n")
+        if self.label is not None:
+            np.save(stem + ".labels.npy", np.full(len(self.paths), self.label, dtype=np.int8))
+
+
+def extract_batch(paths, mode="raw", workers=None, ordered=True, max_in_flight=None, features_file=None,
+                  cache_path=None, max_bytes=MAX_BYTES, budget=None, minimal_parse=False,
+                  archive_pwd=DEFAULT_PASSWORD):
+    """
+    Yields (path, result, error) for every file in paths. result is the raw feature dict encoded as
+    JSON (mode="raw") or (float32 FEATURE_COLS vector, what the budget cut from it) (mode="lite"); on
+    failure it is None and error holds the exception. At most max_in_flight files (default 4 per worker) are queued at once,
+    so memory stays flat on large directories. workers=0 runs in this process. With cache_path every
+    worker looks samples up in a shared FeatureCache before extracting them. Files are memory-mapped and
+    only their first max_bytes (None: all) are extracted, like the gateway's truncated samples. An
+    ExtractionBudget caps the time and work spent on each file, and minimal_parse has pefile parse only
+    the data directories the enabled features read. .zip files are opened with archive_pwd and their
+    members extracted in memory (archive_pwd=None treats them as plain files).
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers == 0:
+        _init_worker(features_file, mode, cache_path, max_bytes, budget, minimal_parse, archive_pwd)
+        for i, path in enumerate(iter_paths(paths)):
+            yield from _extract(i, path)[1]
+        return
+
+    max_in_flight = max_in_flight or 4 * workers
+    path_iter = enumerate(iter_paths(paths))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(features_file, mode, cache_path, max_bytes, budget,
+                                       minimal_parse, archive_pwd)) as pool:
+        pending = deque() if ordered else set()
+        submit = pending.append if ordered else pending.add
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                item = next(path_iter, None)
+                if item is None:
+                    exhausted = True
+                    break
+                submit(pool.submit(_extract, *item))
+            if not pending:
+                break
+
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending -= done
+            for future in done:
+                yield from future.result()[1]
+
+
+def run(paths, out_path, mode=None, label=None, workers=None, ordered=True, max_in_flight=None,
+        features_file=None, errors_path=None, cache_path=None, max_bytes=MAX_BYTES, budget=None,
+        minimal_parse=False, archive_pwd=DEFAULT_PASSWORD):
+    """Extracts every file into out_path (.npy -> NumpySink with lite vectors, anything else -> JSONL).
+    Failed files are listed in errors_path (default <out>.errors.jsonl). Returns (n_ok, n_errors)."""
+    is_npy = out_path.endswith(".npy")
+    mode = mode or ("lite" if is_npy else "raw")
+    sink = NumpySink(out_path, label) if is_npy else JsonlSink(out_path, label)
+    errors_path = errors_path or os.path.splitext(out_path)[0] + ".errors.jsonl"
+
+    n_ok = n_errors = n_truncated = 0
+    start = time.perf_counter()
+    with open(errors_path, "w", encoding="utf8") as errors:
+        try:
+            for path, result, error in extract_batch(paths, mode, workers, ordered, max_in_flight, features_file,
+                                                       cache_path, max_bytes, budget, minimal_parse,
+                                                       archive_pwd):
+                if error is not None:
+                    n_errors += 1
+                    errors.write(json.dumps({"path": path, "error": error}) + "\n")
+                    continue
+                sink.write(path, result)
+                n_ok += 1
+                if isinstance(result, tuple) and result[1]:
+                    n_truncated += 1
+                if n_ok % 1000 == 0:
+                    print(f"[*] {n_ok} files ({n_ok / (time.perf_counter() - start):.1f} files/s)")
+        finally:
+            sink.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"[*] Extracted {n_ok} files in {elapsed:.1f}s, {n_errors} errors -> {out_path}")
+    if n_errors:
+        print(f"[!] Errors written to {errors_path}")
+    if n_truncated:
+        print(f"[!] {n_truncated} vectors were cut short by the extraction budget (see their \"truncated\" lists)")
+    return n_ok, n_errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel PE feature extraction")
+    parser.add_argument("out", help="output .jsonl (raw features) or .npy (lite vectors)")
+    parser.add_argument("paths", nargs="+", help="directories or files to extract")
+    parser.add_argument("--mode", choices=MODES, help="default: lite for .npy, raw otherwise")
+    parser.add_argument("--label", type=int, help="label added to every record")
+    parser.add_argument("--workers", type=int, help="worker processes (default: all cores, 0: in-process)")
+    parser.add_argument("--max-in-flight", type=int, help="files queued at once (default: 4 per worker)")
+    parser.add_argument("--unordered", action="store_true", help="write results as they finish")
+    parser.add_argument("--features-file", type=Path, help="JSON file selecting the feature types")
+    parser.add_argument("--cache", help="SQLite feature cache shared by the workers")
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES,
+                        help=f"bytes of each file to extract (default: {MAX_BYTES}, 0: whole file)")
+    parser.add_argument("--max-seconds", type=float,
+                        help="per-file time budget; slow files lose their imports/exports and signature features")
+    parser.add_argument("--minimal-parse", action="store_true",
+                        help="only parse the data directories the enabled features read")
+    parser.add_argument("--archive-password", default=DEFAULT_PASSWORD.decode(),
+                        help="password of .zip sample archives (default: infected)")
+    parser.add_argument("--no-archives", action="store_true", help="treat .zip files as plain samples")
+    args = parser.parse_args()
+
+    run(args.paths, args.out, args.mode, args.label, args.workers, not args.unordered,
+        args.max_in_flight, args.features_file, cache_path=args.cache,
+        max_bytes=args.max_bytes or None,
+        budget=ExtractionBudget(max_seconds=args.max_seconds) if args.max_seconds else None,
+        minimal_parse=args.minimal_parse,
+        archive_pwd=None if args.no_archives else args.archive_password.encode())
+
+
+if __name__ == "__main__":
+    main()
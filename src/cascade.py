@@ -0,0 +1,125 @@
+'''
+Two-stage cascade scoring. A cheap model (the 100-tree SOREL lite models) scores every file; only
+files whose fast score falls inside an uncertainty band [low, high) are escalated to the large
+model (the 500-tree EMBER lite models). Below the band a file is called benign, at or above it
+malicious, inside it the large model decides at its own threshold. The band is calibrated on a
+validation set as the narrowest one whose combined FPR and recall stay within a tolerance of the
+large model alone.
+
+    cascade = CascadeScorer(CompiledModel.load("sorel.npz"), CompiledModel.load("ember.npz"), threshold=0.5)
+    cascade.calibrate(y_val, X_val_fast, X_val_full)
+    verdicts = cascade.predict(X_fast, X_full)
+    print(cascade.stats())
+'''
+import numpy as np
+
+BAND_GRID = 512
+MAX_FPR_DELTA = 0.001
+MAX_RECALL_DELTA = 0.005
+
+
+def calibrate_band(y_true, fast_scores, full_scores, threshold, max_fpr_delta=MAX_FPR_DELTA,
+                   max_recall_delta=MAX_RECALL_DELTA, grid=BAND_GRID):
+    """
+    The (low, high) band that escalates the fewest validation rows while the cascade's FPR and
+    recall stay within max_fpr_delta / max_recall_delta of the full model's at threshold. Band
+    edges are searched over grid quantiles of the fast scores; escalating everything is always
+    feasible, so a band is always found. Labels other than 0 and 1 are ignored.
+    """
+    y = np.asarray(y_true)
+    keep = (y == 0) | (y == 1)
+    y = y[keep]
+    f = np.asarray(fast_scores, dtype=np.float64)[keep]
+    g = np.asarray(full_scores, dtype=np.float64)[keep] >= threshold
+    pos, neg = max(int((y == 1).sum()), 1), max(int((y == 0).sum()), 1)
+
+    def sorted_scores(mask):
+        return np.sort(f[mask])
+
+    # below low the cascade says benign: the full model's TPs / FPs there are lost
+    lost_tp = sorted_scores((y == 1) & g)
+    lost_fp = sorted_scores((y == 0) & g)
+    # at or above high it says malicious: the full model's FNs / TNs there are flipped
+    gain_tp = sorted_scores((y == 1) & ~g)
+    gain_fp = sorted_scores((y == 0) & ~g)
+    everything = np.sort(f)
+
+    edges = np.unique(np.quantile(f, np.linspace(0.0, 1.0, grid))) if len(f) else np.zeros(0)
+    edges = np.concatenate([[-np.inf], edges, [np.inf]])
+    below = lambda a: np.searchsorted(a, edges, side="left")        # rows with f < edge
+    at_or_above = lambda a: len(a) - np.searchsorted(a, edges, side="left")
+
+    d_recall = (at_or_above(gain_tp)[None, :] - below(lost_tp)[:, None]) / pos
+    d_fpr = (at_or_above(gain_fp)[None, :] - below(lost_fp)[:, None]) / neg
+    escalated = below(everything)[None, :] - below(everything)[:, None]
+    feasible = (np.abs(d_recall) <= max_recall_delta) & (np.abs(d_fpr) <= max_fpr_delta) & \
+               (edges[:, None] <= edges[None, :])
+    cost = np.where(feasible, escalated + np.abs(d_fpr), np.inf)
+    i, j = np.unravel_index(np.argmin(cost), cost.shape)
+
+    ref_tp = int(((y == 1) & g).sum())
+    ref_fp = int(((y == 0) & g).sum())
+    return {
+        "low": float(edges[i]), "high": float(edges[j]), "threshold": float(threshold),
+        "escalation_rate": float(escalated[i, j] / max(len(f), 1)),
+        "full_recall": ref_tp / pos, "full_fpr": ref_fp / neg,
+        "cascade_recall": ref_tp / pos + float(d_recall[i, j]),
+        "cascade_fpr": ref_fp / neg + float(d_fpr[i, j]),
+    }
+
+
+class CascadeScorer:
+    """
+    fast / full are models with predict(X) -> probabilities (lgb.Booster, CompiledModel). Each
+    stage gets its own feature matrix (X_full defaults to X_fast), and the full model only sees
+    the escalated rows. Stage counts accumulate over every call until reset_stats().
+    """
+
+    def __init__(self, fast, full, low=-np.inf, high=np.inf, threshold=0.5):
+        self.fast = fast
+        self.full = full
+        self.low = low
+        self.high = high
+        self.threshold = threshold
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.counts = {"rows": 0, "fast_benign": 0, "fast_malicious": 0, "escalated": 0}
+
+    def calibrate(self, y_true, X_fast, X_full=None, **kwargs):
+        """Fits the band on a validation set (both models score every row); returns the report"""
+        X_full = X_fast if X_full is None else X_full
+        report = calibrate_band(y_true, self.fast.predict(X_fast), self.full.predict(X_full),
+                                self.threshold, **kwargs)
+        self.low, self.high = report["low"], report["high"]
+        return report
+
+    def score(self, X_fast, X_full=None):
+        """
+        (scores, escalated): the full model's score for escalated rows and the fast model's for
+        the rest, and the mask of escalated rows
+        """
+        X_full = X_fast if X_full is None else X_full
+        scores = np.asarray(self.fast.predict(X_fast), dtype=np.float64)
+        escalated = (scores >= self.low) & (scores < self.high)
+        rows = np.flatnonzero(escalated)
+        self.counts["rows"] += len(scores)
+        self.counts["escalated"] += len(rows)
+        self.counts["fast_benign"] += int((scores < self.low).sum())
+        self.counts["fast_malicious"] += int((scores >= self.high).sum())
+        if len(rows):
+            scores[rows] = self.full.predict(X_full[rows])
+        return scores, escalated
+
+    def predict(self, X_fast, X_full=None):
+        """0 / 1 verdicts of the cascade"""
+        scores, escalated = self.score(X_fast, X_full)
+        return np.where(escalated, scores >= self.threshold, scores >= self.high).astype(int)
+
+    def stats(self):
+        """Rows decided by each stage, as counts and fractions of all rows scored"""
+        rows = max(self.counts["rows"], 1)
+        stats = dict(self.counts)
+        for key in ("fast_benign", "fast_malicious", "escalated"):
+            stats[f"{key}_rate"] = self.counts[key] / rows
+        return stats
@@ -0,0 +1,151 @@
+'''
+Scores a batch of files against several registered models in one pass. Features are extracted once
+per file; each model reads its own feature_names out of the shared columns (FEATURE_COLS by
+default, or a separate named source such as the SOREL vectors) and is scored with its own
+lgb.Booster. The per-model scores are combined with a rule: mean, max, weighted (mean with the
+registered weights) or vote (fraction of models at or above their own threshold).
+
+ModelEnsemble(merged=True) instead merges the trees of all models into one CompiledModel and walks
+them together. That beats separate CompiledModel predicts, but not the Boosters: on the five
+common_folder models it is no faster at batch size 1 and 2-3x slower from 64 rows up
+(scripts/bench_ensemble.py), so it is opt-in.
+
+    ensemble = ModelEnsemble()
+    ensemble.add("ember_2024", "../common_folder/ember_lite_model_2024.txt")
+    ensemble.add("ember_2024_v2", "../common_folder/ember_lite_model_2024_v2.txt", weight=2.0)
+    scores = ensemble.score(X, rule="weighted")   # DataFrame: one column per model + "ensemble"
+'''
+import numpy as np
+import pandas as pd
+import lightgbm as lgb
+
+from config import FEATURE_COLS
+from model_artifact import check_features, load_model
+from tree_compiler import CompiledModel
+
+RULES = ("mean", "max", "weighted", "vote")
+
+
+def feature_names(model):
+    """Input feature names of a Booster or CompiledModel"""
+    return model.feature_name() if isinstance(model, lgb.Booster) else model.feature_names
+
+
+class ModelEnsemble:
+    """
+    Registered models. Models with source=None read feature_cols of the main matrix; the others read
+    the matrix passed as inputs[source], by name when that source's columns are given to
+    add_input(), else positionally. With merged=True the models must be CompiledModels, scored
+    through one merged forest.
+    """
+
+    def __init__(self, feature_cols=FEATURE_COLS, merged=False):
+        self.feature_cols = list(feature_cols)
+        self.merged = merged
+        self.input_cols = {}  # source name -> its column names, or its width
+        self.members = []  # (name, model, weight, threshold, source)
+        self._merged = None
+        self._member_cols = None
+
+    def add_input(self, name, columns):
+        """Declares a separate input matrix: its column names, or just its number of columns"""
+        self.input_cols[name] = list(columns) if not isinstance(columns, int) else columns
+        self._merged = self._member_cols = None
+
+    def add(self, name, model, weight=1.0, threshold=0.5, source=None):
+        """Registers an lgb.Booster, a CompiledModel, or the path of a text model (loaded as a Booster,
+        or through its compiled artifact when merged)"""
+        if any(member[0] == name for member in self.members):
+            raise ValueError(f"A model named {name} is already registered")
+        if isinstance(model, str):
+            model = load_model(model, feature_cols=None) if self.merged else lgb.Booster(model_file=model)
+        if self.merged and not isinstance(model, CompiledModel):
+            raise ValueError("A merged ensemble needs CompiledModels")
+        if source is not None and source not in self.input_cols:
+            self.add_input(source, len(feature_names(model)))
+        self._columns(model, source)  # fail now rather than on the first batch
+        self.members.append((name, model, float(weight), float(threshold), source))
+        self._merged = self._member_cols = None
+        return model
+
+    @property
+    def names(self):
+        return [member[0] for member in self.members]
+
+    def _columns(self, model, source):
+        """Positions of the model's features in its input matrix"""
+        cols = self.feature_cols if source is None else self.input_cols[source]
+        names = feature_names(model)
+        if isinstance(cols, int):
+            if len(names) != cols:
+                raise ValueError(f"Input {source} has {cols} columns, the model reads {len(names)}")
+            return list(range(cols))
+        return check_features(names, cols)
+
+    def _merge(self):
+        """The merged forest over [main matrix | each extra source], built once per set of models"""
+        if self._merged is None:
+            offsets, width = {None: 0}, len(self.feature_cols)
+            for source, cols in self.input_cols.items():
+                offsets[source] = width
+                width += cols if isinstance(cols, int) else len(cols)
+            maps = [offsets[source] + np.asarray(self._columns(model, source), dtype=np.int32)
+                    for _, model, _, _, source in self.members]
+            models = [member[1] for member in self.members]
+            merged = CompiledModel.merge(models, maps, [f"f{i}" for i in range(width)])
+            bounds = np.cumsum([0] + [model.num_trees for model in models])
+            self._merged = (merged, list(zip(bounds[:-1], bounds[1:])))
+        return self._merged
+
+    def score_matrix(self, X, inputs=None):
+        """(n_rows, n_models) probabilities of every registered model, in registration order"""
+        if not self.members:
+            raise ValueError("No models registered")
+        inputs = inputs or {}
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X[None, :]
+        parts = [X]
+        for source, cols in self.input_cols.items():
+            if source not in inputs:
+                raise ValueError(f"Missing input matrix {source}")
+            part = np.asarray(inputs[source])
+            parts.append(part[None, :] if part.ndim == 1 else part)
+        out = np.empty((len(X), len(self.members)), dtype=np.float64)
+        if not self.merged:
+            if self._member_cols is None:
+                self._member_cols = [self._columns(model, source) for _, model, _, _, source in self.members]
+            sources = dict(zip([None, *self.input_cols], parts))
+            for k, ((_, model, _, _, source), cols) in enumerate(zip(self.members, self._member_cols)):
+                out[:, k] = model.predict(sources[source][:, cols])
+            return out
+
+        merged, slices = self._merge()
+        Z = np.hstack(parts) if len(parts) > 1 else X
+        values = merged.leaf_value[merged.leaves(Z)]
+        for k, ((_, model, *_), (start, end)) in enumerate(zip(self.members, slices)):
+            # sequential sum in each model's tree order, like predict()
+            raw = np.cumsum(values[:, start:end], axis=1)[:, -1] if end > start else np.zeros(len(Z))
+            out[:, k] = model.transform(raw)
+        return out
+
+    def combine(self, matrix, rule="mean"):
+        """Ensemble score of each row of a score matrix"""
+        if rule == "mean":
+            return matrix.mean(axis=1)
+        if rule == "max":
+            return matrix.max(axis=1)
+        if rule == "weighted":
+            weights = np.array([member[2] for member in self.members])
+            return matrix @ (weights / weights.sum())
+        if rule == "vote":
+            thresholds = np.array([member[3] for member in self.members])
+            return (matrix >= thresholds).mean(axis=1)
+        raise ValueError(f"Unknown rule {rule}, expected one of {RULES}")
+
+    def score(self, X, inputs=None, rule="mean"):
+        """Per-model scores and the combined one (column "ensemble") as a DataFrame"""
+        matrix = self.score_matrix(X, inputs)
+        df = pd.DataFrame(matrix, columns=self.names)
+        df["ensemble"] = self.combine(matrix, rule)
+        return df
@@ -3,11 +3,14 @@ import pandas as pd
 import lightgbm as lgb
 
 from config import FEATURE_COLS
+from operating_point import OperatingCurve, REPORT_FPRS
 from sklearn.metrics import confusion_matrix, accuracy_score
 
 DATA_PATH = "../data/test_real/vaulted_test_set.csv"
 MODEL_PATH = "../model/ember_tuned_2026_fpr.txt"
 THRESHOLD = 0.5
+TARGET_FPR = 0.10
+CURVE_FILE = "operating_curve.csv"
 
 
 def count_binary(values: pd.Series | np.ndarray) -> tuple[int, int]:
@@ -40,9 +43,12 @@ def main() -> None:
 	for col in feat_cols:
 		X_df[col] = pd.to_numeric(X_df[col], errors="coerce").astype(np.float32)
 
-	X = X_df[feat_cols].values
-
 	model = lgb.Booster(model_file=MODEL_PATH)
+	missing = [col for col in model.feature_name() if col not in feat_cols]
+	if missing:
+		raise ValueError(f"The dataset is missing {len(missing)} model feature columns: {missing[:10]}")
+
+	X = X_df[model.feature_name()].values
 	y_prob = model.predict(X)
 	y_pred = (y_prob >= THRESHOLD).astype(int)
 
@@ -84,14 +90,22 @@ def main() -> None:
 	print(f"\n[!] AUTOPSY: Dumped the {len(fp_df)} False Positives to {AUTOPSY_FILE}")
     
     
-	print("\n[*] --- THRESHOLD SWEEP ---")
-	for thresh in [0.5, 0.6, 0.7, 0.8, 0.9, 0.95]:
-		y_pred_thresh = (y_prob >= thresh).astype(int)
-		tn, fp, fn, tp = confusion_matrix(true_labels, y_pred_thresh, labels=[0, 1]).ravel()
-		fpr = fp / (fp + tn) if (fp + tn) > 0 else 0
-		fnr = fn / (fn + tp) if (fn + tp) > 0 else 0
-		print(f"  Thresh {thresh:.2f} | FPR: {fpr * 100:5.1f}% | FNR: {fnr * 100:5.1f}% | FP: {fp:<3} | TP: {tp}")
-  
+	# Exact operating points from one sort of the scores, and the full ROC / PR table
+	curve = OperatingCurve.from_scores(true_labels.to_numpy(), y_prob)
+	print(f"\n[*] --- OPERATING POINTS (AUC {curve.auc():.5f}) ---")
+	for max_fpr in REPORT_FPRS:
+		point = curve.best_threshold(max_fpr)
+		if point is not None:
+			print(f"  FPR<={max_fpr * 100:4.1f}% | Thresh {point['threshold']:.6f} | FNR: {point['fnr'] * 100:5.1f}% | FP: {point['fp']:<3} | TP: {point['tp']}")
+
+	best = curve.best_threshold(TARGET_FPR)
+	if best is not None:
+		print(f"[*] Best threshold @ FPR <= {TARGET_FPR:.2f}: {best['threshold']:.6f} (FNR {best['fnr'] * 100:.1f}%)")
+	else:
+		print(f"[*] No threshold met target FPR <= {TARGET_FPR:.2f}.")
+
+	curve.table().to_csv(CURVE_FILE, index=False)
+	print(f"[*] ROC / PR table ({len(curve.scores)} thresholds) written to {CURVE_FILE}")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 import numpy as np
+import json
 import hashlib
-from config import HDR_OPT_FIELDS, HDR_OPT_ALIASES, STANDARD_SEC_NAMES, GUI_DLLS, CRT_PREFIXES
+from config import FEATURE_COLS, HDR_OPT_FIELDS, HDR_OPT_ALIASES, STANDARD_SEC_NAMES, GUI_DLLS, CRT_PREFIXES
 
 def safe_get(d, *keys, default=0):
     for k in keys:
@@ -9,12 +10,97 @@ def safe_get(d, *keys, default=0):
         d = d.get(k, default)
     return d if d is not None else default
 
-def stable_hash_bin(value, bins):
-    digest = hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).digest()
+def _hash_bin(key, bins):
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
     idx = int.from_bytes(digest, "little") % bins
     sign = -1.0 if (digest[0] & 1) else 1.0
     return idx, sign
 
+
+# Rich header comp-ids come from a small vocabulary of compiler / linker builds, so their bins are memoized
+HASH_BIN_CACHE_SIZE = 1 << 16
+
+
+class HashBinCache:
+    """
+    Bounded memo of stable_hash_bin, keyed by str(value) and bins like the hash itself, in front of
+    an optional precomputed table (e.g. the comp-ids seen in training, shipped with the model).
+    Once max_size entries are cached the oldest one is dropped for every new one.
+    """
+
+    def __init__(self, max_size=HASH_BIN_CACHE_SIZE):
+        self.max_size = max_size
+        self.table = {}
+        self.cache = {}
+        self.table_hits = 0
+        self.cache_hits = 0
+        self.misses = 0
+
+    def lookup(self, value, bins):
+        key = (str(value), bins)
+        result = self.table.get(key)
+        if result is not None:
+            self.table_hits += 1
+            return result
+        result = self.cache.get(key)
+        if result is not None:
+            self.cache_hits += 1
+            return result
+        self.misses += 1
+        result = _hash_bin(key[0], bins)
+        if len(self.cache) >= self.max_size:
+            del self.cache[next(iter(self.cache))]
+        self.cache[key] = result
+        return result
+
+    def stats(self):
+        lookups = self.table_hits + self.cache_hits + self.misses
+        return {
+            "lookups": lookups,
+            "table_hits": self.table_hits,
+            "cache_hits": self.cache_hits,
+            "misses": self.misses,
+            "hit_rate": (self.table_hits + self.cache_hits) / lookups if lookups else 0.0,
+            "table_size": len(self.table),
+            "cache_size": len(self.cache),
+        }
+
+    def clear(self):
+        self.cache.clear()
+        self.table_hits = self.cache_hits = self.misses = 0
+
+    def save_table(self, path, values=(), bins=8):
+        """Writes the table, the cached entries and the bins of values as JSON"""
+        for value in values:
+            self.lookup(value, bins)
+        table = {}
+        for (key, n), (idx, sign) in {**self.cache, **self.table}.items():
+            table.setdefault(str(n), {})[key] = [idx, sign]
+        with open(path, "w", encoding="utf8") as f:
+            json.dump({"bins": table}, f)
+
+    def load_table(self, path, verify=True):
+        """Loads a table written by save_table. With verify every entry is checked against the hash,
+        so a stale or edited table can't change the features"""
+        with open(path, encoding="utf8") as f:
+            table = json.load(f)["bins"]
+        loaded = {}
+        for n, entries in table.items():
+            for key, (idx, sign) in entries.items():
+                result = (int(idx), float(sign))
+                if verify and _hash_bin(key, int(n)) != result:
+                    raise ValueError(f"Hash table entry {key!r} (bins={n}) does not match stable_hash_bin")
+                loaded[(key, int(n))] = result
+        self.table = loaded
+        return len(loaded)
+
+
+HASH_BIN_CACHE = HashBinCache()
+
+
+def stable_hash_bin(value, bins):
+    return HASH_BIN_CACHE.lookup(value, bins)
+
 def extract_row_features(row):
     """Extract all flat features from one JSONL row. Returns a dict of scalars."""
     out = {}
@@ -193,4 +279,251 @@ def extract_row_features(row):
         out["overlay_entropy"] = overlay_entropy
         out["overlay_present"] = int(bool(overlay_size))
 
-    return out
\ No newline at end of file
+    return out
+
+# Column of each feature in the matrix returned by extract_batch_features()
+FEATURE_IDX = {col: i for i, col in enumerate(FEATURE_COLS)}
+GEN_FIELDS = ["vsize", "size", "has_debug", "has_relocations",
+              "has_resources", "has_signature", "has_tls", "symbols"]
+AUTH_FIELDS = ["auth_num_certs", "auth_self_signed", "auth_parse_error", "auth_chain_depth",
+               "auth_sign_time_delta_abs", "auth_no_countersigner"]
+WARN_FIELDS = ["pe_warn_count", "pe_warn_checksum", "pe_warn_section", "pe_warn_import",
+               "pe_warn_export", "pe_warn_overlay"]
+OVERLAY_FIELDS = ["overlay_size", "overlay_size_ratio", "overlay_entropy", "overlay_present"]
+
+
+def to_float(value):
+    """value as train.py's pd.to_numeric(errors="coerce") reads it: numbers and numeric strings, else NaN"""
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return np.nan
+    return np.nan
+
+
+def _put(out, col, values):
+    """Writes one feature for every row, coerced like to_float()"""
+    idx = FEATURE_IDX.get(col)
+    if idx is None:
+        return
+    try:
+        # numbers, numeric strings and None all convert in one pass; anything else falls back per value
+        column = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        column = None
+    if column is None or column.ndim != 1:
+        column = np.array([to_float(v) for v in values], dtype=np.float64)
+    out[:, idx] = column
+
+
+def extract_batch_features(rows, out=None):
+    """
+    Columnar extract_row_features for a batch of JSONL rows. Fills an (n_rows, len(FEATURE_COLS))
+    float32 matrix in FEATURE_COLS order (out, if given) with the values train.py gets from
+    extract_row_features after its float32 conversion, working one feature group at a time over
+    the whole batch instead of building a dict per row.
+    """
+    n = len(rows)
+    if out is None:
+        out = np.zeros((n, len(FEATURE_COLS)), dtype=np.float32)
+    elif out.shape != (n, len(FEATURE_COLS)):
+        raise ValueError(f"out has shape {out.shape}, expected {(n, len(FEATURE_COLS))}")
+    if n == 0:
+        return out
+
+    # -- General --
+    gens = [row.get("general", {}) for row in rows]
+    for field in GEN_FIELDS:
+        _put(out, f"gen_{field}", [safe_get(g, field) for g in gens])
+
+    # -- Header (file + optional) --
+    headers = [row.get("header", {}) for row in rows]
+    files = [safe_get(h, "file", default={}) for h in headers]
+    for field in ["machine", "timestamp", "characteristics"]:
+        _put(out, f"hdr_{field}", [safe_get(f, field) for f in files])
+    optionals = [safe_get(h, "optional", default={}) for h in headers]
+    for field, alias in zip(HDR_OPT_FIELDS, HDR_OPT_ALIASES):
+        _put(out, f"hdr_{alias}", [safe_get(o, field) for o in optionals])
+    chars = [safe_get(f, "characteristics") for f in files]
+    _put(out, "is_dll", [int(bool(c & 0x2000)) if isinstance(c, (int, float)) else 0 for c in chars])
+
+    # -- Sections --
+    secs = [row.get("section", {}) for row in rows]
+    sections = [sec.get("sections", []) if isinstance(sec, dict) else [] for sec in secs]
+    counts = np.array([len(s) for s in sections], dtype=np.int64)
+    _put(out, "sec_count", counts)
+
+    flags = []  # exec, write, read, high entropy, standard name, upx, inno per row
+    for ss in sections:
+        ex = wr = rd = hi = std = upx = inno = 0
+        for s in ss:
+            props = s.get("props", [])
+            ex += "MEM_EXECUTE" in props
+            wr += "MEM_WRITE" in props
+            rd += "MEM_READ" in props
+            hi += s.get("entropy", 0) > 7.0
+            nm = s.get("name", "").lower().strip()
+            std += nm in STANDARD_SEC_NAMES
+            upx = upx or "upx" in nm
+            inno = inno or nm == ".itext"
+        flags.append((ex, wr, rd, hi, std, int(upx), int(inno)))
+    ex, wr, rd, hi, std, upx, inno = (np.array(c, dtype=np.float64) for c in zip(*flags))
+    nz = counts > 0
+    safe_n = np.where(nz, counts, 1)
+    _put(out, "sec_exec_count", ex)
+    _put(out, "sec_write_count", wr)
+    _put(out, "sec_read_count", rd)
+    _put(out, "sec_exec_ratio", ex / safe_n)
+    _put(out, "sec_write_ratio", wr / safe_n)
+    _put(out, "sec_high_entropy_frac", hi / safe_n)
+    _put(out, "sec_std_name_frac", std / safe_n)
+    _put(out, "has_upx_sections", upx)
+    _put(out, "has_inno_sections", inno)
+
+    # Per-section values flattened over the batch, reduced per row (rows without sections stay 0)
+    ent_mean = ent_max = ent_min = ent_std = rsz_mean = rsz_max = vsz_mean = np.zeros(n)
+    if nz.any():
+        ent = np.array([s.get("entropy", 0) for ss in sections for s in ss], dtype=np.float64)
+        rsz = np.array([s.get("size", 0) for ss in sections for s in ss], dtype=np.float64)
+        vsz = np.array([s.get("vsize", 0) for ss in sections for s in ss], dtype=np.float64)
+        starts = (np.cumsum(counts) - counts)[nz]
+        k = counts[nz]
+
+        def per_row(values):
+            full = np.zeros(n)
+            full[nz] = values
+            return full
+
+        means = np.add.reduceat(ent, starts) / k
+        dev = ent - np.repeat(means, k)
+        ent_mean = per_row(means)
+        ent_max = per_row(np.maximum.reduceat(ent, starts))
+        ent_min = per_row(np.minimum.reduceat(ent, starts))
+        ent_std = per_row(np.sqrt(np.add.reduceat(dev * dev, starts) / k))
+        rsz_mean = per_row(np.add.reduceat(rsz, starts) / k)
+        rsz_max = per_row(np.maximum.reduceat(rsz, starts))
+        vsz_mean = per_row(np.add.reduceat(vsz, starts) / k)
+    _put(out, "sec_entropy_mean", ent_mean)
+    _put(out, "sec_entropy_max", ent_max)
+    _put(out, "sec_entropy_min", ent_min)
+    _put(out, "sec_entropy_std", ent_std)
+    _put(out, "sec_rawsize_mean", rsz_mean)
+    _put(out, "sec_rawsize_max", rsz_max)
+    _put(out, "sec_virtsize_mean", vsz_mean)
+
+    # -- Data Directories --
+    dd_cols = []
+    for row in rows:
+        dd = row.get("datadirectories", [])
+        if isinstance(dd, list):
+            dd_cols.append((
+                len(dd),
+                sum(1 for d in dd if isinstance(d, dict) and d.get("size", 0) > 0),
+                dd[2].get("size", 0) if len(dd) > 2 and isinstance(dd[2], dict) else 0,
+                int((dd[4].get("size", 0) if len(dd) > 4 and isinstance(dd[4], dict) else 0) > 0),
+            ))
+        elif isinstance(dd, dict):
+            dd_cols.append((len(dd), sum(1 for d in dd.values() if isinstance(d, dict) and d.get("size", 0) > 0), 0, 0))
+        else:
+            dd_cols.append((0, 0, 0, 0))
+    for col, values in zip(["datadir_count", "datadir_nonempty", "dd_resource_size", "dd_cert_present"], zip(*dd_cols)):
+        _put(out, col, values)
+
+    # -- Imports / Exports --
+    imp_cols = []
+    exp_counts = []
+    for row in rows:
+        imp = row.get("imports", {})
+        if isinstance(imp, dict) and len(imp) > 0:
+            dll_lower = {k.lower() for k in imp.keys()}
+            imp_cols.append((
+                1, len(imp), sum(len(v) if isinstance(v, list) else 0 for v in imp.values()),
+                int(bool(dll_lower & GUI_DLLS)), int(any(d.startswith(CRT_PREFIXES) for d in dll_lower)),
+            ))
+        else:
+            imp_cols.append((0, 0, 0, 0, 0))
+        exp = row.get("exports", [])
+        exp_counts.append(len(exp) if isinstance(exp, (list, dict)) else 0)
+    for col, values in zip(["imp_available", "imp_dll_count", "imp_func_count", "imp_has_gui_libs", "imp_has_crt"],
+                           zip(*imp_cols)):
+        _put(out, col, values)
+    _put(out, "exp_count", exp_counts)
+    _put(out, "exp_available", [int(c > 0) for c in exp_counts])
+
+    # -- Rich Header --
+    rich_bins = 8
+    rich = np.zeros((n, rich_bins + 1))  # hash bins, then the pair count
+    for r, row in enumerate(rows):
+        rich_obj = row.get("rich_header", row.get("richheader", row.get("rich", [])))
+        rich_values = []
+        if isinstance(rich_obj, dict):
+            rich_values = rich_obj.get("values", rich_obj.get("raw", []))
+        elif isinstance(rich_obj, list):
+            rich_values = rich_obj
+        if isinstance(rich_values, list) and len(rich_values) >= 2:
+            n_pairs = len(rich_values) // 2
+            rich[r, rich_bins] = n_pairs
+            for i in range(0, n_pairs * 2, 2):
+                count = rich_values[i + 1]
+                if not isinstance(count, (int, float)):
+                    continue
+                idx, sign = stable_hash_bin(rich_values[i], rich_bins)
+                rich[r, idx] += sign * float(count)
+    for i in range(rich_bins):
+        _put(out, f"rich_hash_{i}", rich[:, i])
+    _put(out, "rich_num_pairs", rich[:, rich_bins])
+
+    # -- Authenticode --
+    auth_cols = []
+    for row in rows:
+        auth = row.get("authenticode", row.get("signature", row.get("signing", {})))
+        if isinstance(auth, dict):
+            sign_delta = safe_get(auth, "signing_time_diff", default=safe_get(auth, "sign_time_delta", default=0))
+            auth_cols.append((
+                safe_get(auth, "num_certs", default=safe_get(auth, "certificate_count", default=0)),
+                int(bool(safe_get(auth, "self_signed", default=0))),
+                int(bool(safe_get(auth, "parse_error", default=0))),
+                safe_get(auth, "chain_max_depth", default=safe_get(auth, "chain_depth", default=0)),
+                abs(sign_delta) if isinstance(sign_delta, (int, float)) else 0,
+                int(bool(safe_get(auth, "no_countersigner", default=0))),
+            ))
+        else:
+            auth_cols.append((0, 0, 0, 0, 0, 0))
+    for col, values in zip(AUTH_FIELDS, zip(*auth_cols)):
+        _put(out, col, values)
+
+    # -- PE Parse Warnings --
+    warn_cols = []
+    for row in rows:
+        warnings_obj = row.get("pe_warnings", row.get("pefile_warnings", row.get("pefilewarnings", row.get("warnings", []))))
+        if isinstance(warnings_obj, str):
+            warnings_list = [warnings_obj]
+        elif isinstance(warnings_obj, dict):
+            warnings_list = [f"{k}:{v}" for k, v in warnings_obj.items()]
+        elif isinstance(warnings_obj, list):
+            warnings_list = [str(w) for w in warnings_obj]
+        else:
+            warnings_list = []
+        text = " ".join(w.lower() for w in warnings_list)
+        warn_cols.append((len(warnings_list), "checksum" in text, "section" in text, "import" in text,
+                          "export" in text, "overlay" in text))
+    for col, values in zip(WARN_FIELDS, zip(*warn_cols)):
+        _put(out, col, values)
+
+    # -- Overlay --
+    overlay_cols = []
+    for row, sec in zip(rows, secs):
+        overlay = row.get("overlay", safe_get(sec, "overlay", default={}))
+        if isinstance(overlay, dict):
+            size = safe_get(overlay, "size", default=0)
+            overlay_cols.append((size, safe_get(overlay, "size_ratio", default=0),
+                                 safe_get(overlay, "entropy", default=0), int(bool(size))))
+        else:
+            overlay_cols.append((0, 0, 0, 0))
+    for col, values in zip(OVERLAY_FIELDS, zip(*overlay_cols)):
+        _put(out, col, values)
+
+    return out
@@ -13,21 +13,113 @@ for your modeling problem.
 """
 
 import os
+import bisect
 import hashlib
 import json
 import re
-import io
+import struct
 import math
+import time
 from pathlib import Path
 from collections import Counter, OrderedDict
 
 import numpy as np
 import pefile
-from sklearn.feature_extraction import FeatureHasher
 import signify
-from signify.authenticode import AuthenticodeFile
+from signify.authenticode import AuthenticodeSignature as SignedData
 from datetime import datetime
 
+from config import FEATURE_COLS, STANDARD_SEC_NAMES, GUI_DLLS, CRT_PREFIXES
+from extractor_json import stable_hash_bin
+from feature_hashing import hash_pairs, hash_strings
+
+
+def entropy_from_counts(counts):
+    """Shannon entropy in bits of a byte histogram"""
+    total = counts.sum()
+    if total == 0:
+        return 0.0
+    p = counts[counts > 0] / total
+    return float(-np.sum(p * np.log2(p)))
+
+
+class ByteStats(object):
+    """
+    Byte histograms of one sample, computed over a single zero-copy NumPy view of the file
+    so that every feature type can share them
+    """
+
+    def __init__(self, bytez, file_size=None):
+        self.bytez = bytez
+        self.arr = np.frombuffer(bytez, dtype=np.uint8)
+        # Size of the file on disk. Larger than the view when the sample was truncated on read
+        self.file_size = len(self.arr) if file_size is None else file_size
+        self._histogram = None
+
+    @property
+    def histogram(self):
+        """Byte histogram of the whole file"""
+        if self._histogram is None:
+            self._histogram = np.bincount(self.arr, minlength=256)
+        return self._histogram
+
+    def entropy(self, start=0, end=None):
+        """Entropy of bytez[start:end]"""
+        if start <= 0 and (end is None or end >= len(self.arr)):
+            return entropy_from_counts(self.histogram)
+        return entropy_from_counts(np.bincount(self.arr[start:end], minlength=256))
+
+    def section_entropy(self, section):
+        """Same value as section.get_entropy(), without copying the section data"""
+        offset = section.get_PointerToRawData_adj()
+        end = offset + section.SizeOfRawData
+        if section.PointerToRawData is not None:
+            end = min(end, section.PointerToRawData + section.SizeOfRawData)
+        if end <= offset:
+            return 0.0
+        return self.entropy(offset, end)
+
+    def overlay(self, pe):
+        """(size, entropy) of the data appended after the PE image, or None if there is no overlay.
+        The size is measured against the file on disk, the entropy over the part that was read"""
+        offset = overlay_offset(pe, self.file_size)
+        if offset is None:
+            return None
+        return self.file_size - offset, self.entropy(offset)
+
+
+def overlay_offset(pe, file_size):
+    """pe.get_overlay_data_start_offset() for a file of file_size bytes, of which pe may only have
+    been given the start"""
+    largest = 0
+
+    def extent(offset, size):
+        end = offset + size
+        return end if largest < end <= file_size else largest
+
+    if hasattr(pe, "OPTIONAL_HEADER"):
+        largest = extent(pe.OPTIONAL_HEADER.get_file_offset(), pe.FILE_HEADER.SizeOfOptionalHeader)
+
+    for section in pe.sections:
+        largest = extent(section.PointerToRawData, section.SizeOfRawData)
+
+    security = pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_SECURITY"]
+    for idx, directory in enumerate(pe.OPTIONAL_HEADER.DATA_DIRECTORY):
+        if idx == security:
+            continue
+        rva = directory.VirtualAddress
+        if pe.get_section_by_rva(rva) is not None:
+            offset = pe.get_offset_from_rva(rva)
+        elif rva < file_size:
+            offset = rva
+        else:
+            continue
+        largest = extent(offset, directory.Size)
+
+    if file_size > largest:
+        return largest
+    return None
+
 
 class FeatureType(object):
     """
@@ -40,18 +132,19 @@ class FeatureType(object):
     def __repr__(self):
         return "{}({})".format(self.name, self.dim)
 
-    def raw_features(self, bytez: bytes, pe: pefile.PE | None = None):
-        """Generate a JSON-able representation of the file"""
+    def raw_features(self, bytez: bytes, pe: pefile.PE | None = None, stats: ByteStats | None = None):
+        """Generate a JSON-able representation of the file. stats is the sample's ByteStats when the
+        extractor already has one (it carries the on-disk size of a truncated sample)"""
         raise (NotImplementedError)
 
     def process_raw_features(self, raw_obj):
         """Generate a feature vector from the raw features"""
         raise (NotImplementedError)
 
-    def feature_vector(self, bytez: bytes, pe: pefile.PE | None = None):
+    def feature_vector(self, bytez: bytes, pe: pefile.PE | None = None, stats: ByteStats | None = None):
         """Directly calculate the feature vector from the sample itself. This should only be implemented differently
         if there are significant speedups to be gained from combining the two functions."""
-        return self.process_raw_features(self.raw_features(bytez, pe))
+        return self.process_raw_features(self.raw_features(bytez, pe, stats))
 
 
 class GeneralFileInfo(FeatureType):
@@ -65,19 +158,15 @@ class GeneralFileInfo(FeatureType):
     def __init__(self):
         super(FeatureType, self).__init__()
 
-    def raw_features(self, bytez, pe=None):
-        # From pefile entropy_H()
-        size = len(bytez)
-        bytez_arr = bytearray(bytez)
-        occurences = Counter(bytez_arr)
-        entropy = 0
-        for x in occurences.values():
-            p_x = float(x) / size
-            entropy -= p_x * math.log(p_x, 2)
+    def raw_features(self, bytez, pe=None, stats=None):
+        if stats is None:
+            stats = ByteStats(bytez)
+        bytez_arr = stats.arr
+        size = len(bytez_arr)
 
         raw_obj = {
-            "size": size,
-            "entropy": entropy,
+            "size": stats.file_size,
+            "entropy": stats.entropy(),
             "is_pe": 0 if pe is None else 1,
             "start_bytes": [
                 int(bytez_arr[0]),
@@ -111,9 +200,10 @@ class ByteHistogram(FeatureType):
     def __init__(self):
         super(FeatureType, self).__init__()
 
-    def raw_features(self, bytez, pe):
-        counts = np.bincount(np.frombuffer(bytez, dtype=np.uint8), minlength=256)
-        return counts.tolist()
+    def raw_features(self, bytez, pe, stats=None):
+        if stats is None:
+            stats = ByteStats(bytez)
+        return stats.histogram.tolist()
     
     def process_raw_features(self, raw_obj):
         counts = np.array(raw_obj, dtype=np.float32)
@@ -151,22 +241,54 @@ class ByteEntropyHistogram(FeatureType):
 
         return Hbin, c
 
-    def raw_features(self, bytez, pe):
+    def _window_bin_counts(self, a):
+        # coarse histograms of every window at once: count each chunk of gcd(step, window) bytes,
+        # then take differences of the cumulative chunk counts at the window edges
+        n_windows = (a.shape[0] - self.window) // self.step + 1
+        chunk = math.gcd(self.step, self.window)
+        n_chunks = ((n_windows - 1) * self.step + self.window) // chunk
+        nibbles = (a[: n_chunks * chunk] >> 4).reshape(n_chunks, chunk).astype(np.intp)
+        nibbles += np.arange(n_chunks, dtype=np.intp)[:, None] * 16
+        cumulative = np.zeros((n_chunks + 1, 16), dtype=np.int64)
+        np.cumsum(np.bincount(nibbles.ravel(), minlength=n_chunks * 16).reshape(n_chunks, 16), axis=0, out=cumulative[1:])
+        starts = np.arange(n_windows) * (self.step // chunk)
+        return cumulative[starts + self.window // chunk] - cumulative[starts]
+
+    def _entropy_bins(self, c):
+        # Same float32 arithmetic as _entropy_bin_counts, row by row. np.sum adds the nonzero terms
+        # sequentially when there are fewer than 8 of them and pairwise over 8 accumulators otherwise,
+        # so both orders are reproduced to keep the bins identical at the boundaries
+        p = c.astype(np.float32) / self.window
+        with np.errstate(divide="ignore", invalid="ignore"):
+            terms = np.where(c > 0, -p * np.log2(p), np.float32(0))
+        terms = np.take_along_axis(terms, np.argsort(c == 0, axis=1, kind="stable"), axis=1)
+        n_nonzero = np.count_nonzero(c, axis=1)
+
+        sequential = np.zeros(len(c), dtype=np.float32)
+        for j in range(16):
+            sequential += terms[:, j]
+        r = terms[:, :8]
+        pairwise = ((r[:, 0] + r[:, 1]) + (r[:, 2] + r[:, 3])) + ((r[:, 4] + r[:, 5]) + (r[:, 6] + r[:, 7]))
+        for j in range(8, 16):
+            pairwise += terms[:, j]
+        r = terms[:, :8] + terms[:, 8:]
+        pairwise_full = ((r[:, 0] + r[:, 1]) + (r[:, 2] + r[:, 3])) + ((r[:, 4] + r[:, 5]) + (r[:, 6] + r[:, 7]))
+
+        H = np.where(n_nonzero < 8, sequential, np.where(n_nonzero < 16, pairwise, pairwise_full)) * 2
+        return np.minimum((H * 2).astype(np.int64), 15)
+
+    def raw_features(self, bytez, pe, stats=None):
         output = np.zeros((16, 16), dtype=np.int32)
-        a = np.frombuffer(bytez, dtype=np.uint8)
+        a = (stats if stats is not None else ByteStats(bytez)).arr
         if a.shape[0] < self.window:
             Hbin, c = self._entropy_bin_counts(a)
             output[Hbin, :] += c
         else:
-            # strided trick from here: http://www.rigtorp.se/2011/01/01/rolling-statistics-numpy.html
-            shape = a.shape[:-1] + (a.shape[-1] - self.window + 1, self.window)
-            strides = a.strides + (a.strides[-1],)
-            blocks = np.lib.stride_tricks.as_strided(a, shape=shape, strides=strides)[:: self.step, :]
-
-            # from the blocks, compute histogram
-            for block in blocks:
-                Hbin, c = self._entropy_bin_counts(block)
-                output[Hbin, :] += c
+            # accumulate output[Hbin, :] += c for all windows; a weighted bincount is exact for these
+            # counts and much faster than np.add.at
+            c = self._window_bin_counts(a)
+            flat_idx = self._entropy_bins(c)[:, None] * 16 + np.arange(16)
+            output += np.bincount(flat_idx.ravel(), weights=c.ravel(), minlength=256).reshape(16, 16).astype(np.int32)
 
         return output.flatten().tolist()
 
@@ -291,36 +413,65 @@ class StringExtractor(FeatureType):
         }
         self.regex_idxs = {k: v for v, k in enumerate(sorted(self._regexes))}
 
-    def raw_features(self, bytez, pe):
+        # Literal patterns are searched with bytes.find (case-insensitive ones in a lowercased copy),
+        # the rest with an equivalent bytes regex
+        self._scanners = []
+        for k, r in self._regexes.items():
+            ignorecase = bool(r.flags & re.IGNORECASE)
+            if set(r.pattern).isdisjoint(".^$*+?{}[]\\|()"):
+                needle = r.pattern.encode()
+                self._scanners.append((k, True, ignorecase, needle.lower() if ignorecase else needle))
+            else:
+                flags = re.IGNORECASE if ignorecase else 0
+                self._scanners.append((k, False, ignorecase, re.compile(r.pattern.encode(), flags)))
+
+    def _scan(self, joined):
+        # Number of strings with at least one match of each pattern. Every pattern runs over the whole
+        # joined buffer in C; after a hit the scan jumps to the next string, so each string counts once
+        ends = np.flatnonzero(np.frombuffer(joined, dtype=np.uint8) == 0x0A).tolist() + [len(joined)]
+        lowered = joined.lower()
+        string_counts = {}
+        for k, literal, ignorecase, pattern in self._scanners:
+            buf = lowered if ignorecase and literal else joined
+            count = 0
+            pos = 0
+            while True:
+                if literal:
+                    start = buf.find(pattern, pos)
+                else:
+                    m = pattern.search(buf, pos)
+                    start = -1 if m is None else m.start()
+                if start < 0:
+                    break
+                count += 1
+                pos = ends[bisect.bisect_left(ends, start)] + 1
+            if count:
+                string_counts[k] = count
+        return string_counts
+
+    def raw_features(self, bytez, pe, stats=None):
         allstrings = self._allstrings.findall(bytez)
-        allstrings_ascii = [s.decode() for s in allstrings]
         if allstrings:
+            # printable strings joined by newlines, which no pattern can match, so matches stay inside one string
+            joined = b"\n".join(allstrings)
+            # histogram of printable characters 0x20 - 0x7f
+            c = np.bincount(np.frombuffer(joined, dtype=np.uint8), minlength=0x80)[0x20:0x80]
             # statistics about strings:
-            string_lengths = [len(s) for s in allstrings]
-            avlength = sum(string_lengths) / len(string_lengths)
-            # map printable characters 0x20 - 0x7f to an int array consisting of 0-95, inclusive
-            as_shifted_string = [b - ord(b"\x20") for b in b"".join(allstrings)]
-            c = np.bincount(as_shifted_string, minlength=96)  # histogram count
-            # distribution of characters in printable strings
             csum = c.sum()
+            avlength = int(csum) / len(allstrings)
+            # distribution of characters in printable strings
             p = c.astype(np.float32) / csum
             wh = np.where(c)[0]
             H = np.sum(-p[wh] * np.log2(p[wh]))  # entropy
+            string_counts = self._scan(joined)
 
         else:
             avlength = 0
             c = np.zeros((96,), dtype=np.float32)
             H = 0
             csum = 0
+            string_counts = {}
 
-        # Search strings with all regexes
-        string_counts = {}
-        for s in allstrings_ascii:
-            for k, r in self._regexes.items():
-                if re.search(r, s):
-                    if string_counts.get(k) is None:
-                        string_counts[k] = 0
-                    string_counts[k] += 1
         string_counts = OrderedDict(sorted(string_counts.items()))
 
         return {
@@ -363,7 +514,7 @@ class SectionInfo(FeatureType):
     def __init__(self):
         super(FeatureType, self).__init__()
 
-    def raw_features(self, bytez, pe):
+    def raw_features(self, bytez, pe, stats=None):
         if pe is None:
             return {}
 
@@ -380,14 +531,16 @@ class SectionInfo(FeatureType):
                 entry_section = pe.sections[isection].Name.strip(b"\x00").decode(errors="ignore").lower()
             isection += 1
 
+        if stats is None:
+            stats = ByteStats(bytez)
         raw_obj = {"entry": entry_section}
         raw_obj["sections"] = [
             {
                 "name": section.Name.strip(b"\x00").decode(errors="ignore").lower(),
                 "size": section.SizeOfRawData,
-                "entropy": section.get_entropy(),
+                "entropy": stats.section_entropy(section),
                 "vsize": section.Misc_VirtualSize,
-                "size_ratio": section.SizeOfRawData / len(bytez),
+                "size_ratio": section.SizeOfRawData / stats.file_size,
                 "vsize_ratio": section.SizeOfRawData / max(section.Misc_VirtualSize, 1),
                 "props": [sc[10:] for sc, _ in pefile.section_characteristics if section.__dict__[sc]],
             }
@@ -399,21 +552,13 @@ class SectionInfo(FeatureType):
             "entropy": 0,
         }
 
-        overlay = pe.get_overlay()
+        overlay = stats.overlay(pe)
         if overlay is not None:
-
-            # From pefile entropy_H()
-            overlay_size = len(overlay)
-            occurences = Counter(bytearray(overlay))
-            entropy = 0
-            for x in occurences.values():
-                p_x = float(x) / len(overlay)
-                entropy -= p_x * math.log(p_x, 2)
-
+            overlay_size, overlay_entropy = overlay
             raw_obj["overlay"] = {
                 "size": overlay_size,
-                "size_ratio": overlay_size / len(bytez),
-                "entropy": entropy
+                "size_ratio": overlay_size / stats.file_size,
+                "entropy": overlay_entropy
             }
 
         return raw_obj
@@ -448,30 +593,19 @@ class SectionInfo(FeatureType):
             min(vsize_ratios)
         ]
 
-        # Properties of all the individual sections
-        section_sizes = [(s["name"], s["size"]) for s in sections]
-        section_sizes_hashed = FeatureHasher(50, input_type="pair").transform([section_sizes]).toarray()[0]
-        section_vsize = [(s["name"], s["vsize"]) for s in sections]
-        section_vsize_hashed = FeatureHasher(50, input_type="pair").transform([section_vsize]).toarray()[0]
-        section_entropy = [(s["name"], s["entropy"]) for s in sections]
-        section_entropy_hashed = FeatureHasher(50, input_type="pair").transform([section_entropy]).toarray()[0]
+        # Properties of all the individual sections, hashed straight into the output buffer
+        vector = np.zeros(self.dim, dtype=np.float64)
+        vector[:11] = general
+        hash_pairs([(s["name"], s["size"]) for s in sections], 50, out=vector[11:61])
+        hash_pairs([(s["name"], s["vsize"]) for s in sections], 50, out=vector[61:111])
+        hash_pairs([(s["name"], s["entropy"]) for s in sections], 50, out=vector[111:161])
         characteristics = [f"{s['name']}:{p}" for s in sections for p in s["props"]]
-        characteristics_hashed = FeatureHasher(50, input_type="string").transform([characteristics]).toarray()[0]
-        entry_name_hashed = FeatureHasher(10, input_type="string").transform([[raw_obj["entry"]]]).toarray()[0]
-
-        return np.hstack(
-            [
-                general,
-                section_sizes_hashed,
-                section_vsize_hashed,
-                section_entropy_hashed,
-                characteristics_hashed,
-                entry_name_hashed,
-                raw_obj["overlay"]["size"],
-                raw_obj["overlay"]["size_ratio"],
-                raw_obj["overlay"]["entropy"]
-            ]
-        ).astype(np.float32)
+        hash_strings(characteristics, 50, out=vector[161:211])
+        hash_strings([raw_obj["entry"]], 10, out=vector[211:221])
+        vector[221] = raw_obj["overlay"]["size"]
+        vector[222] = raw_obj["overlay"]["size_ratio"]
+        vector[223] = raw_obj["overlay"]["entropy"]
+        return vector.astype(np.float32)
 
 
 class ImportsInfo(FeatureType):
@@ -487,7 +621,7 @@ class ImportsInfo(FeatureType):
     def __init__(self):
         super(FeatureType, self).__init__()
 
-    def raw_features(self, bytez, pe):
+    def raw_features(self, bytez, pe, stats=None):
         imports = {}
         if pe is None or "DIRECTORY_ENTRY_IMPORT" not in pe.__dict__.keys():
             return imports
@@ -512,17 +646,18 @@ class ImportsInfo(FeatureType):
 
         # Unique libraries
         libraries = list(set([l.lower() for l in raw_obj.keys()]))
-        libraries_hashed = FeatureHasher(256, input_type="string", alternate_sign=False).transform([libraries]).toarray()[0]
 
         # A string like "kernel32.dll:CreateFileMappingA" for each imported function
         imports = [lib.lower() + ":" + e for lib, elist in raw_obj.items() for e in elist]
-        imports_hashed = FeatureHasher(1024, input_type="string", alternate_sign=False).transform([imports]).toarray()[0]
-
-        # Number of libraries/imports
-        lengths = [len(imports), len(libraries)]
 
-        # Two separate elements: libraries (alone) and fully-qualified names of imported functions
-        return np.hstack([lengths, libraries_hashed, imports_hashed]).astype(np.float32)
+        # Number of libraries/imports, then two separate elements: libraries (alone) and fully-qualified
+        # names of imported functions
+        vector = np.zeros(self.dim, dtype=np.float32)
+        vector[0] = len(imports)
+        vector[1] = len(libraries)
+        hash_strings(libraries, 256, alternate_sign=False, out=vector[2:258])
+        hash_strings(imports, 1024, alternate_sign=False, out=vector[258:])
+        return vector
 
 
 class ExportsInfo(FeatureType):
@@ -537,7 +672,7 @@ class ExportsInfo(FeatureType):
     def __init__(self):
         super(FeatureType, self).__init__()
 
-    def raw_features(self, bytez, pe):
+    def raw_features(self, bytez, pe, stats=None):
         if pe is None:
             return []
 
@@ -555,7 +690,7 @@ class ExportsInfo(FeatureType):
         if not raw_obj:
             return np.zeros(self.dim, dtype=np.float32)
 
-        exports_hashed = FeatureHasher(128, input_type="string").transform([raw_obj]).toarray()[0]
+        exports_hashed = hash_strings(raw_obj, 128)
         return np.hstack([np.array([len(exports_hashed)]), exports_hashed.astype(np.float32)])
 
 
@@ -678,7 +813,7 @@ class HeaderFileInfo(FeatureType):
             "e_lfanew",
         ]
 
-    def raw_features(self, bytez, pe):
+    def raw_features(self, bytez, pe, stats=None):
         if pe is None:
             return {}
 
@@ -842,7 +977,7 @@ class DataDirectories(FeatureType):
             "RESERVED",
         ]
 
-    def raw_features(self, bytez, pe):
+    def raw_features(self, bytez, pe, stats=None):
         output = []
         if pe is None:
             return output
@@ -890,7 +1025,7 @@ class RichHeader(FeatureType):
     def __init__(self):
         super(FeatureType, self).__init__()
 
-    def raw_features(self, bytez, pe):
+    def raw_features(self, bytez, pe, stats=None):
         if pe is not None and pe.RICH_HEADER is not None:
             return pe.RICH_HEADER.values
         return []
@@ -901,8 +1036,14 @@ class RichHeader(FeatureType):
 
         number_of_pairs = int(len(raw_obj) / 2)
         paired_values = [(str(raw_obj[i]), raw_obj[i + 1]) for i in range(0, len(raw_obj) - 1, 2)]
-        paired_values_hashed = FeatureHasher(32, input_type="pair").transform([paired_values]).toarray()[0]
-        return np.hstack([number_of_pairs, paired_values_hashed]).astype(np.float32)
+        vector = np.zeros(self.dim, dtype=np.float64)
+        vector[0] = number_of_pairs
+        hash_pairs(paired_values, 32, out=vector[1:])
+        return vector.astype(np.float32)
+
+
+# WIN_CERTIFICATE.wCertificateType of an Authenticode (PKCS#7 SignedData) entry
+WIN_CERT_TYPE_PKCS_SIGNED_DATA = 2
 
 
 class AuthenticodeSignature(FeatureType):
@@ -912,11 +1053,70 @@ class AuthenticodeSignature(FeatureType):
 
     name = "authenticode"
     dim = 8
+    cache_size = 1024
 
     def __init__(self):
         super(FeatureType, self).__init__()
-
-    def raw_features(self, bytez, pe):
+        # sha256 of the certificate table -> (per-signature summaries, parse_error)
+        self._parsed = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    @staticmethod
+    def _cert_table(bytez, pe):
+        """memoryview of the certificate table, or None when the file carries no signature"""
+        dirs = pe.OPTIONAL_HEADER.DATA_DIRECTORY
+        if len(dirs) <= pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_SECURITY"]:
+            return None
+        security = dirs[pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_SECURITY"]]
+        # The security directory holds a file offset, not an RVA
+        start, size = security.VirtualAddress, security.Size
+        if start == 0 or size == 0 or start >= len(bytez):
+            return None
+        return memoryview(bytez)[start:start + size]
+
+    @staticmethod
+    def _iter_signatures(table):
+        """AuthenticodeSignatures of the WIN_CERTIFICATE entries in the certificate table, nested ones
+        included, checked the way signify walks a file's table"""
+        position, found = 0, False
+        while position < len(table):
+            if position + 8 > len(table):
+                raise signify.exceptions.SignedPEParseError("Position of certificate table is beyond length of file")
+            length, revision, certificate_type = struct.unpack_from("<IHH", table, position)
+            if length <= 8 or position + length > len(table):
+                raise signify.exceptions.SignedPEParseError("Invalid length in certificate table header")
+            if revision != 0x200:
+                raise signify.exceptions.SignedPEParseError(f"Unknown certificate revision {revision!r}")
+            if certificate_type == WIN_CERT_TYPE_PKCS_SIGNED_DATA:
+                signed_data = SignedData.from_envelope(bytes(table[position + 8:position + length]))
+                yield from signed_data.iter_recursive_nested()
+                found = True
+            # entries are 8-byte aligned
+            position += length + (8 - length % 8) % 8
+        if not found:
+            raise signify.exceptions.SignedPEParseError("A SignedData structure was not found in the certificate table")
+
+    def _parse_signatures(self, table):
+        # Each summary is filled in the order the fields are read, so a parse error halfway
+        # through a signature leaves the same partial features as reading them directly
+        signatures = []
+        try:
+            for signed_data in self._iter_signatures(table):
+                summary = []
+                signatures.append(summary)
+                signer_info = signed_data.signer_info
+                summary.append(signer_info.program_name is None)
+                countersigner = signer_info.countersigner
+                summary.append(countersigner.signing_time.timestamp() if countersigner is not None else None)
+                certs = list(signed_data.certificates)
+                summary.append(len(certs))
+                summary.append(any(cert.issuer == cert.subject for cert in certs[:-1]))
+        except (signify.exceptions.SignerInfoParseError, signify.exceptions.ParseError, ValueError, KeyError):
+            return signatures, 1
+        return signatures, 0
+
+    def raw_features(self, bytez, pe, stats=None):
         if pe is None:
             return {}
 
@@ -930,43 +1130,43 @@ class AuthenticodeSignature(FeatureType):
             "latest_signing_time": 0,
             "signing_time_diff": 0,
         }
-        try:
-            signed_pe = AuthenticodeFile.from_stream(io.BytesIO(bytez))
-            for signed_data in signed_pe.iter_signed_datas():
-                raw_obj["num_certs"] += 1
-                if signed_data.signer_info.program_name is None:
-                    raw_obj["empty_program_name"] = 1
-
-                # Parse countersigner
-                signer_info = signed_data.signer_info
-                countersigner = signer_info.countersigner
+        # Without a certificate table signify finds no SignedData and yields nothing,
+        # so unsigned files skip the parse and keep the defaults
+        table = self._cert_table(bytez, pe)
+        if table is None:
+            return raw_obj
 
-                # Parse signing time
-                if countersigner is not None:
-                    signing_time = countersigner.signing_time.timestamp()
+        key = hashlib.sha256(table).digest()
+        parsed = self._parsed.get(key)
+        if parsed is None:
+            self.cache_misses += 1
+            parsed = self._parse_signatures(table)
+            if len(self._parsed) >= self.cache_size:
+                self._parsed.clear()
+            self._parsed[key] = parsed
+        else:
+            self.cache_hits += 1
+
+        signatures, raw_obj["parse_error"] = parsed
+        for summary in signatures:
+            raw_obj["num_certs"] += 1
+            if len(summary) > 0 and summary[0]:
+                raw_obj["empty_program_name"] = 1
+
+            # signing_time_diff depends on this file's header, so it is not cached
+            if len(summary) > 1:
+                signing_time = summary[1]
+                if signing_time is not None:
                     if signing_time >= raw_obj["latest_signing_time"]:
                         raw_obj["latest_signing_time"] = signing_time
-                    pe_timestamp = pe.FILE_HEADER.TimeDateStamp
-                    raw_obj["signing_time_diff"] = signing_time - pe_timestamp
+                    raw_obj["signing_time_diff"] = signing_time - pe.FILE_HEADER.TimeDateStamp
                 else:
                     raw_obj["no_countersigner"] = 1
 
-                # Check if cert is self-signed
-                certs = signed_data.certificates
-                if len(certs) > raw_obj["chain_max_depth"]:
-                    raw_obj["chain_max_depth"] = len(certs)
-                for cert in certs[:-1]:
-                    if cert.issuer == cert.subject:
-                        raw_obj["self_signed"] = 1
-
-        except signify.exceptions.SignerInfoParseError:
-            raw_obj["parse_error"] = 1
-        except signify.exceptions.ParseError:
-            raw_obj["parse_error"] = 1
-        except ValueError:
-            raw_obj["parse_error"] = 1
-        except KeyError:
-            raw_obj["parse_error"] = 1
+            if len(summary) > 2 and summary[2] > raw_obj["chain_max_depth"]:
+                raw_obj["chain_max_depth"] = summary[2]
+            if len(summary) > 3 and summary[3]:
+                raw_obj["self_signed"] = 1
         return raw_obj
 
     def process_raw_features(self, raw_obj):
@@ -993,6 +1193,9 @@ class PEFormatWarnings(FeatureType):
     name = "pefilewarnings"
     dim = 87 + 1
 
+    # Bounds on the normalization memo and on the distinct unknown warnings kept in unknown_warnings
+    cache_size = 4096
+
     def __init__(self, warnings_file: Path):
         self.warning_prefixes = set()
         self.warning_suffixes = set()
@@ -1011,28 +1214,51 @@ class PEFormatWarnings(FeatureType):
                         self.warning_ids[line] = i
                     i += 1
 
-    def raw_features(self, bytez, pe):
+        # Suffixes are matched as prefixes of the reversed warning
+        self._suffix_re = self._compile_prefixes([suf[::-1] for suf in self.warning_suffixes])
+        self._prefix_re = self._compile_prefixes(self.warning_prefixes)
+        self._normalized = {}
+        self.unknown_warnings = Counter()
+
+    @staticmethod
+    def _compile_prefixes(prefixes):
+        # One anchored alternation, longest entries first so the most specific one wins
+        if not prefixes:
+            return None
+        return re.compile("|".join(re.escape(p) for p in sorted(prefixes, key=len, reverse=True)))
+
+    def normalize(self, warning):
+        """Map a pefile warning to its entry in pefile_warnings.txt, or None if it is unknown"""
+        if warning in self._normalized:
+            return self._normalized[warning]
+
+        norm = None
+        m = self._suffix_re.match(warning[::-1]) if self._suffix_re is not None else None
+        if m is not None:
+            norm = "..." + m.group()[::-1]
+        else:
+            m = self._prefix_re.match(warning) if self._prefix_re is not None else None
+            if m is not None:
+                norm = m.group() + "..."
+
+        if len(self._normalized) >= self.cache_size:
+            self._normalized.clear()
+        self._normalized[warning] = norm
+        return norm
+
+    def raw_features(self, bytez, pe, stats=None):
         if pe is None:
             return []
 
-        warnings = set(pe.get_warnings())
         warnings_norm = set()
-        for warning in warnings:
-            found_warning = False
-            for suf in self.warning_suffixes:
-                if warning.endswith(suf):
-                    warnings_norm.add("..." + suf)
-                    found_warning = True
-                    break
-            if found_warning:
-                continue
-            for pre in self.warning_prefixes:
-                if warning.startswith(pre):
-                    warnings_norm.add(pre + "...")
-                    found_warning = True
-                    break
-            if not found_warning:
-                print("WARN: Unknown pefile warning:", warning)
+        for warning in set(pe.get_warnings()):
+            norm = self.normalize(warning)
+            if norm is not None:
+                warnings_norm.add(norm)
+            elif warning in self.unknown_warnings or len(self.unknown_warnings) < self.cache_size:
+                self.unknown_warnings[warning] += 1
+            else:
+                self.unknown_warnings["<other>"] += 1
 
         return sorted(warnings_norm)
 
@@ -1048,12 +1274,102 @@ class PEFormatWarnings(FeatureType):
         return np.array(ids, dtype=np.float32)
 
 
+# Position of each lite model feature in the vector returned by PEFeatureExtractor.lite_vector()
+LITE_IDX = {col: i for i, col in enumerate(FEATURE_COLS)}
+
+# OPTIONAL_HEADER fields behind the hdr_* lite features. subsystem and dll_characteristics are a string and
+# a list in the raw JSON, which train.py coerces to NaN, and file_alignment is not part of the raw JSON at all.
+# hdr_machine, hdr_timestamp, hdr_characteristics and is_dll stay 0: extract_row_features reads them from a
+# "file" header key that the raw JSON does not have
+LITE_OPTIONAL_ATTRS = [
+    ("hdr_sizeof_code", "SizeOfCode"),
+    ("hdr_sizeof_headers", "SizeOfHeaders"),
+    ("hdr_sizeof_init", "SizeOfInitializedData"),
+    ("hdr_sizeof_uninit", "SizeOfUninitializedData"),
+    ("hdr_sizeof_heap_commit", "SizeOfHeapCommit"),
+    ("hdr_magic", "Magic"),
+    ("hdr_major_linker_ver", "MajorLinkerVersion"),
+    ("hdr_minor_linker_ver", "MinorLinkerVersion"),
+    ("hdr_major_os_ver", "MajorOperatingSystemVersion"),
+    ("hdr_minor_os_ver", "MinorOperatingSystemVersion"),
+    ("hdr_major_img_ver", "MajorImageVersion"),
+    ("hdr_minor_img_ver", "MinorImageVersion"),
+    ("hdr_major_subsys_ver", "MajorSubsystemVersion"),
+    ("hdr_minor_subsys_ver", "MinorSubsystemVersion"),
+]
+LITE_NAN_COLS = ["hdr_subsystem", "hdr_dll_characteristics"]
+
+SCN_MEM_EXECUTE = pefile.SECTION_CHARACTERISTICS["IMAGE_SCN_MEM_EXECUTE"]
+SCN_MEM_READ = pefile.SECTION_CHARACTERISTICS["IMAGE_SCN_MEM_READ"]
+SCN_MEM_WRITE = pefile.SECTION_CHARACTERISTICS["IMAGE_SCN_MEM_WRITE"]
+GUI_DLLS_B = {d.encode() for d in GUI_DLLS}
+CRT_PREFIXES_B = tuple(p.encode() for p in CRT_PREFIXES)
+
+# pefile's full_load order
+DIRECTORY_PARSE_ORDER = [
+    "IMAGE_DIRECTORY_ENTRY_IMPORT", "IMAGE_DIRECTORY_ENTRY_EXPORT", "IMAGE_DIRECTORY_ENTRY_RESOURCE",
+    "IMAGE_DIRECTORY_ENTRY_DEBUG", "IMAGE_DIRECTORY_ENTRY_BASERELOC", "IMAGE_DIRECTORY_ENTRY_TLS",
+    "IMAGE_DIRECTORY_ENTRY_LOAD_CONFIG", "IMAGE_DIRECTORY_ENTRY_DELAY_IMPORT",
+    "IMAGE_DIRECTORY_ENTRY_BOUND_IMPORT", "IMAGE_DIRECTORY_ENTRY_EXCEPTION",
+]
+# Data directories each feature type reads from the parsed sample, for minimal_parse. Feature types
+# not listed only need the headers, the section table and the Rich header
+FEATURE_DIRECTORIES = {
+    "imports": ["IMAGE_DIRECTORY_ENTRY_IMPORT"],
+    "exports": ["IMAGE_DIRECTORY_ENTRY_EXPORT"],
+    # has_relocs() and has_dynamic_relocs()
+    "datadirectories": ["IMAGE_DIRECTORY_ENTRY_BASERELOC", "IMAGE_DIRECTORY_ENTRY_LOAD_CONFIG"],
+}
+# The same for the FEATURE_COLS that lite_vector fills (the datadir_* columns only use the directory table)
+LITE_FEATURE_DIRECTORIES = {
+    "imports": ["IMAGE_DIRECTORY_ENTRY_IMPORT"],
+    "exports": ["IMAGE_DIRECTORY_ENTRY_EXPORT"],
+}
+# Raw values of the feature types a budgeted extraction may skip once past its deadline; they are
+# what the feature type reports for a sample without that data
+BUDGET_SKIP_DEFAULTS = {"authenticode": {}, "pefilewarnings": []}
+
+
+class RichHeaderInfo(object):
+    """Holder for the parsed Rich header, as set by pefile's full_load"""
+
+
+def load_rich_header(pe):
+    """Sets pe.RICH_HEADER like the end of pefile's full_load, for fast-loaded samples"""
+    rich_header = pe.parse_rich_header()
+    pe.RICH_HEADER = None
+    if rich_header:
+        pe.RICH_HEADER = RichHeaderInfo()
+        pe.RICH_HEADER.checksum = rich_header.get("checksum", None)
+        pe.RICH_HEADER.values = rich_header.get("values", None)
+        pe.RICH_HEADER.key = rich_header.get("key", None)
+        pe.RICH_HEADER.raw_data = rich_header.get("raw_data", None)
+        pe.RICH_HEADER.clear_data = rich_header.get("clear_data", None)
+
+
+class ExtractionBudget(object):
+    """
+    Per-file limits for PEFeatureExtractor(budget=...). Past a limit the remaining expensive work is
+    skipped instead of stalling the worker: data directories are left unparsed, so imports and exports
+    come out unavailable (as for the import dropout the models are trained with), and past the deadline
+    the authenticode and pefile warning groups keep their defaults. The cuts are listed in
+    extractor.truncated and under "truncated" in raw_features().
+    """
+
+    def __init__(self, max_seconds=2.0, max_sections=256, max_imports=4096, max_warnings=256):
+        self.max_seconds = max_seconds
+        self.max_sections = max_sections
+        self.max_imports = max_imports
+        self.max_warnings = max_warnings
+
+
 class PEFeatureExtractor(object):
     """
     Extract useful features from a PE file, and return as a vector of fixed size.
     """
 
-    def __init__(self, features_file: Path | None = None):
+    def __init__(self, features_file: Path | None = None, profiler=None, budget: ExtractionBudget | None = None,
+                 minimal_parse: bool = False):
 
         cwd = os.path.dirname(os.path.abspath(__file__))
         warnings_file = Path(os.path.join(cwd, "pefile_warnings.txt"))
@@ -1062,8 +1378,8 @@ class PEFeatureExtractor(object):
         features = OrderedDict([
             ("GeneralFileInfo", GeneralFileInfo()),
             # ("ByteHistogram", ByteHistogram()),
-            # ("ByteEntropyHistogram", ByteEntropyHistogram()),
-            # ("StringExtractor", StringExtractor()),
+            ("ByteEntropyHistogram", ByteEntropyHistogram()),
+            ("StringExtractor", StringExtractor()),
             ("HeaderFileInfo", HeaderFileInfo()),
             ("SectionInfo", SectionInfo()),
             ("ImportsInfo", ImportsInfo()),
@@ -1084,21 +1400,306 @@ class PEFeatureExtractor(object):
 
         self.dim = sum([fe.dim for fe in self.features])
 
-    def raw_features(self, bytez: bytes):
+        self._by_name = {fe.name: fe for fe in self.features}
+        # Optional profiler.ExtractionProfiler, timing pefile and every feature type per file
+        self.profiler = profiler
+        self.budget = budget
+        # What the budget cut from the last sample, and when its time is up
+        self.truncated = []
+        self._deadline = None
+
+        # With minimal_parse pefile only parses the data directories the enabled feature types read.
+        # pefile warnings then only come from those directories, so pe_warn_* can differ on malformed
+        # resources, relocations, etc.
+        self.minimal_parse = minimal_parse
+        self._raw_directories = self._required_directories(FEATURE_DIRECTORIES)
+        self._lite_directories = self._required_directories(LITE_FEATURE_DIRECTORIES)
+
+    def _required_directories(self, requirements):
+        """Data directories the enabled feature types need, in pefile's parse order"""
+        needed = {d for fe in self.features for d in requirements.get(fe.name, [])}
+        return [name for name in DIRECTORY_PARSE_ORDER if name in needed]
+
+    def _directories(self, lite):
+        if not self.minimal_parse:
+            return DIRECTORY_PARSE_ORDER
+        return self._lite_directories if lite else self._raw_directories
+
+    def _stage(self, stage, fn, *args):
+        if self.profiler is None:
+            return fn(*args)
+        return self.profiler.measure(stage, fn, *args)
+
+    def parse(self, bytez: bytes, lite: bool = False):
+        """Parse the sample with pefile. Returns None if it is not a PE file. lite selects the data
+        directories lite_vector needs when minimal_parse is on"""
+        if self.budget is not None:
+            return self._budgeted_parse(bytez, lite)
         pe = None
         try:
-            pe = pefile.PE(data=bytez)
+            if self.minimal_parse:
+                pe = pefile.PE(data=bytez, fast_load=True)
+                directories = self._directories(lite)
+                if directories:
+                    pe.parse_data_directories(directories=[pefile.DIRECTORY_ENTRY[name] for name in directories])
+                load_rich_header(pe)
+            else:
+                pe = pefile.PE(data=bytez)
         except pefile.PEFormatError:
             pass
         except AttributeError:
             pass
+        return pe
+
+    def _budgeted_parse(self, bytez, lite=False):
+        """pefile.PE(data=bytez) one data directory at a time, stopping at the budget's limits.
+        Starts the sample's deadline. Within the limits the result is the same as a full load."""
+        budget = self.budget
+        self.truncated = []
+        self._deadline = time.perf_counter() + budget.max_seconds
+        try:
+            pe = pefile.PE(data=bytez, fast_load=True)
+        except (pefile.PEFormatError, AttributeError):
+            return None
+
+        warnings = pe.get_warnings()
+        if len(pe.sections) > budget.max_sections:
+            self.truncated.append(f"sections>{budget.max_sections}")
+        else:
+            for name in self._directories(lite):
+                if time.perf_counter() > self._deadline:
+                    self.truncated.append(f"deadline:{name[len('IMAGE_DIRECTORY_ENTRY_'):].lower()}")
+                    break
+                if len(warnings) > budget.max_warnings:
+                    break
+                if name == "IMAGE_DIRECTORY_ENTRY_IMPORT":
+                    self._budgeted_imports(pe, warnings)
+                else:
+                    pe.parse_data_directories(directories=[pefile.DIRECTORY_ENTRY[name]])
+        if len(warnings) > budget.max_warnings:
+            del warnings[budget.max_warnings:]
+            self.truncated.append(f"warnings>{budget.max_warnings}")
+
+        load_rich_header(pe)
+        return pe
+
+    def _budgeted_imports(self, pe, warnings):
+        """Parses the import directory with pefile's import symbol cap lowered to the budget, so a huge
+        import table is cut off while it is read rather than after. The deadline is only checked between
+        directories; this cap is what bounds the time spent inside this one. pefile counts the entries of
+        both the lookup and the address table (and their terminators), so the cap is 2 * max_imports and
+        a sample a little under max_imports spread over many DLLs can also be cut."""
+        directory = [pefile.DIRECTORY_ENTRY["IMAGE_DIRECTORY_ENTRY_IMPORT"]]
+        default_limit = pefile.MAX_IMPORT_SYMBOLS
+        limit = 2 * self.budget.max_imports
+        if limit >= default_limit:
+            pe.parse_data_directories(directories=directory)
+            return
+        seen = len(warnings)
+        pefile.MAX_IMPORT_SYMBOLS = limit
+        try:
+            pe.parse_data_directories(directories=directory)
+        finally:
+            pefile.MAX_IMPORT_SYMBOLS = default_limit
+        if any(w.startswith("Excessive number of imports") for w in warnings[seen:]):
+            # The partial import list would pass for a complete one: drop it, and the warnings the cap
+            # set off, like an unparsed directory
+            del warnings[seen:]
+            if hasattr(pe, "DIRECTORY_ENTRY_IMPORT"):
+                del pe.DIRECTORY_ENTRY_IMPORT
+            self.truncated.append(f"imports>{self.budget.max_imports}")
+
+    def _over_budget(self, name):
+        """True when the budgeted feature type name should be skipped for the current sample"""
+        if self._deadline is None or name not in BUDGET_SKIP_DEFAULTS or time.perf_counter() <= self._deadline:
+            return False
+        self.truncated.append(f"deadline:{name}")
+        return True
+
+    def raw_features(self, bytez: bytes, file_size: int | None = None):
+        """file_size is the size of the file on disk when bytez is only its first MAX_BYTES"""
+        # one ByteStats per sample, handed to every feature type
+        stats = ByteStats(bytez, file_size)
+        if self.profiler is not None or self.budget is not None:
+            return self._checked_raw_features(bytez, stats)
+        pe = self.parse(bytez)
         features = {"sha256": hashlib.sha256(bytez).hexdigest()}
-        features.update({fe.name: fe.raw_features(bytez, pe) for fe in self.features})
+        features.update({fe.name: fe.raw_features(bytez, pe, stats) for fe in self.features})
         return features
 
+    def _checked_raw_features(self, bytez, stats):
+        # raw_features with profiling and/or a budget
+        if self.profiler is not None:
+            self.profiler.start_file()
+        try:
+            pe = self._stage("parse", self.parse, bytez)
+            features = {"sha256": hashlib.sha256(bytez).hexdigest()}
+            for fe in self.features:
+                if self._over_budget(fe.name):
+                    features[fe.name] = type(BUDGET_SKIP_DEFAULTS[fe.name])()
+                else:
+                    features[fe.name] = self._stage(fe.name, fe.raw_features, bytez, pe, stats)
+            if self.budget is not None:
+                features["truncated"] = list(self.truncated)
+            return features
+        finally:
+            # a file that fails halfway still counts, it is likely one of the slowest
+            self._deadline = None
+            if self.profiler is not None:
+                self.profiler.end_file(bytez, stats.file_size)
+
     def process_raw_features(self, raw_obj):
         feature_vectors = [fe.process_raw_features(raw_obj[fe.name]) for fe in self.features]
         return np.hstack(feature_vectors).astype(np.float32)
 
-    def feature_vector(self, bytez):
-        return self.process_raw_features(self.raw_features(bytez))
\ No newline at end of file
+    def feature_vector(self, bytez, file_size=None):
+        return self.process_raw_features(self.raw_features(bytez, file_size))
+
+    def lite_vector(self, bytez: bytes, file_size: int | None = None):
+        """Calculate the config.FEATURE_COLS vector directly from the sample. Gives the same values as
+        extract_row_features(self.raw_features(bytez)) after train.py's float32 conversion, but walks the
+        pefile object once instead of building the raw JSON dicts. Columns of disabled feature types are 0."""
+        stats = ByteStats(bytez, file_size)
+        try:
+            if self.profiler is not None:
+                self.profiler.start_file()
+                try:
+                    return self._lite_vector(bytez, stats)
+                finally:
+                    self.profiler.end_file(bytez, file_size)
+            return self._lite_vector(bytez, stats)
+        finally:
+            self._deadline = None
+
+    def _lite_vector(self, bytez, stats):
+        out = np.zeros(len(FEATURE_COLS), dtype=np.float32)
+        if "general" in self._by_name:
+            out[LITE_IDX["gen_size"]] = stats.file_size
+
+        pe = self._stage("parse", self.parse, bytez, True)
+        if pe is None:
+            return out
+
+        if "header" in self._by_name:
+            opt = pe.OPTIONAL_HEADER
+            for col, attr in LITE_OPTIONAL_ATTRS:
+                out[LITE_IDX[col]] = getattr(opt, attr)
+            for col in LITE_NAN_COLS:
+                out[LITE_IDX[col]] = np.nan
+
+        if "section" in self._by_name:
+            self._stage("section", self._lite_sections, out, pe, stats)
+
+        if "datadirectories" in self._by_name:
+            # The raw JSON list starts with the has_relocs entry, so the list positions 2 and 4 that
+            # extract_row_features reads are data directories 1 and 3
+            dirs = pe.OPTIONAL_HEADER.DATA_DIRECTORY
+            out[LITE_IDX["datadir_count"]] = len(dirs) + 1
+            out[LITE_IDX["datadir_nonempty"]] = sum(1 for d in dirs if d.Size > 0)
+            if len(dirs) > 1:
+                out[LITE_IDX["dd_resource_size"]] = dirs[1].Size
+            if len(dirs) > 3:
+                out[LITE_IDX["dd_cert_present"]] = dirs[3].Size > 0
+
+        if "imports" in self._by_name and hasattr(pe, "DIRECTORY_ENTRY_IMPORT"):
+            # A repeated dll name replaces the earlier entry, as in ImportsInfo.raw_features
+            func_counts = {}
+            for entry in pe.DIRECTORY_ENTRY_IMPORT:
+                func_counts[entry.dll] = sum(
+                    1 for lib in entry.imports
+                    if (lib.name is not None and len(lib.name)) or lib.ordinal is not None
+                )
+            if func_counts:
+                dll_lower = {dll.lower() for dll in func_counts}
+                out[LITE_IDX["imp_available"]] = 1
+                out[LITE_IDX["imp_dll_count"]] = len(func_counts)
+                out[LITE_IDX["imp_func_count"]] = sum(func_counts.values())
+                out[LITE_IDX["imp_has_gui_libs"]] = bool(dll_lower & GUI_DLLS_B)
+                out[LITE_IDX["imp_has_crt"]] = any(d.startswith(CRT_PREFIXES_B) for d in dll_lower)
+
+        if "exports" in self._by_name and hasattr(pe, "DIRECTORY_ENTRY_EXPORT"):
+            n_exports = sum(
+                1 for exp in pe.DIRECTORY_ENTRY_EXPORT.symbols
+                if (exp.name is not None and len(exp.name)) or exp.ordinal is not None
+            )
+            out[LITE_IDX["exp_count"]] = n_exports
+            out[LITE_IDX["exp_available"]] = n_exports > 0
+
+        if "richheader" in self._by_name and pe.RICH_HEADER is not None:
+            values = pe.RICH_HEADER.values
+            if len(values) >= 2:
+                n_pairs = len(values) // 2
+                out[LITE_IDX["rich_num_pairs"]] = n_pairs
+                rich_hash = np.zeros(8, dtype=np.float64)
+                for i in range(0, n_pairs * 2, 2):
+                    idx, sign = stable_hash_bin(values[i], 8)
+                    rich_hash[idx] += sign * float(values[i + 1])
+                for i in range(8):
+                    out[LITE_IDX[f"rich_hash_{i}"]] = rich_hash[i]
+
+        if "authenticode" in self._by_name and not self._over_budget("authenticode"):
+            auth = self._stage("authenticode", self._by_name["authenticode"].raw_features, bytez, pe)
+            out[LITE_IDX["auth_num_certs"]] = auth["num_certs"]
+            out[LITE_IDX["auth_self_signed"]] = bool(auth["self_signed"])
+            out[LITE_IDX["auth_parse_error"]] = bool(auth["parse_error"])
+            out[LITE_IDX["auth_chain_depth"]] = auth["chain_max_depth"]
+            out[LITE_IDX["auth_sign_time_delta_abs"]] = abs(auth["signing_time_diff"])
+            out[LITE_IDX["auth_no_countersigner"]] = bool(auth["no_countersigner"])
+
+        if "pefilewarnings" in self._by_name and not self._over_budget("pefilewarnings"):
+            warnings = self._stage("pefilewarnings", self._by_name["pefilewarnings"].raw_features, bytez, pe)
+            warnings_text = " ".join(w.lower() for w in warnings)
+            out[LITE_IDX["pe_warn_count"]] = len(warnings)
+            for col, keyword in [("pe_warn_checksum", "checksum"), ("pe_warn_section", "section"),
+                                 ("pe_warn_import", "import"), ("pe_warn_export", "export"),
+                                 ("pe_warn_overlay", "overlay")]:
+                out[LITE_IDX[col]] = keyword in warnings_text
+
+        return out
+
+    def _lite_sections(self, out, pe, stats):
+        n = len(pe.sections)
+        if n > 0:
+            entropy = np.empty(n, dtype=np.float64)
+            raw_size = np.empty(n, dtype=np.float64)
+            virt_size = np.empty(n, dtype=np.float64)
+            n_exec = n_write = n_read = n_std_name = 0
+            has_upx = has_inno = False
+            for i, section in enumerate(pe.sections):
+                entropy[i] = stats.section_entropy(section)
+                raw_size[i] = section.SizeOfRawData
+                virt_size[i] = section.Misc_VirtualSize
+                chars = section.Characteristics
+                n_exec += (chars & SCN_MEM_EXECUTE) > 0
+                n_write += (chars & SCN_MEM_WRITE) > 0
+                n_read += (chars & SCN_MEM_READ) > 0
+                name = section.Name.strip(b"\x00").decode(errors="ignore").lower().strip()
+                n_std_name += name in STANDARD_SEC_NAMES
+                has_upx = has_upx or "upx" in name
+                has_inno = has_inno or name == ".itext"
+
+            out[LITE_IDX["sec_count"]] = n
+            out[LITE_IDX["sec_entropy_mean"]] = entropy.mean()
+            out[LITE_IDX["sec_entropy_max"]] = entropy.max()
+            out[LITE_IDX["sec_entropy_min"]] = entropy.min()
+            out[LITE_IDX["sec_entropy_std"]] = entropy.std()
+            out[LITE_IDX["sec_rawsize_mean"]] = raw_size.mean()
+            out[LITE_IDX["sec_rawsize_max"]] = raw_size.max()
+            out[LITE_IDX["sec_virtsize_mean"]] = virt_size.mean()
+            out[LITE_IDX["sec_exec_count"]] = n_exec
+            out[LITE_IDX["sec_write_count"]] = n_write
+            out[LITE_IDX["sec_read_count"]] = n_read
+            out[LITE_IDX["sec_exec_ratio"]] = n_exec / n
+            out[LITE_IDX["sec_write_ratio"]] = n_write / n
+            out[LITE_IDX["sec_high_entropy_frac"]] = np.count_nonzero(entropy > 7.0) / n
+            out[LITE_IDX["sec_std_name_frac"]] = n_std_name / n
+            out[LITE_IDX["has_upx_sections"]] = has_upx
+            out[LITE_IDX["has_inno_sections"]] = has_inno
+
+        overlay = stats.overlay(pe)
+        if overlay is not None:
+            overlay_size, overlay_entropy = overlay
+            out[LITE_IDX["overlay_size"]] = overlay_size
+            out[LITE_IDX["overlay_size_ratio"]] = overlay_size / stats.file_size
+            out[LITE_IDX["overlay_entropy"]] = overlay_entropy
+            out[LITE_IDX["overlay_present"]] = overlay_size > 0
@@ -0,0 +1,179 @@
+'''
+Content-addressed on-disk cache of extracted features. Entries are keyed by the sample's sha256
+together with the extractor version (enabled FeatureTypes and their dims, FEATURE_COLS, MAX_BYTES),
+so the same installer or DLL seen on another host or in a rescan is only extracted once. Entries
+written by a different extractor version are dropped when the cache is opened. Features an
+ExtractionBudget cut short are returned but never stored, so an unbudgeted run extracts them in full.
+'''
+import json
+import hashlib
+import sqlite3
+
+import numpy as np
+
+from config import FEATURE_COLS, MAX_BYTES
+
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3  # 2GB of stored vectors / raw JSON
+SIZE_REFRESH = 256  # puts between re-reading the total size (other processes may share the file)
+
+
+def extractor_version(extractor):
+    """Hash of everything that changes the stored features: the enabled feature types and dims,
+    the lite column layout, the byte cap and the parse mode"""
+    spec = {
+        "features": [(fe.name, fe.dim) for fe in extractor.features],
+        "feature_cols": FEATURE_COLS,
+        "max_bytes": MAX_BYTES,
+        # pefile warnings only cover the parsed directories
+        "minimal_parse": extractor.minimal_parse,
+    }
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    SQLite store of lite vectors (and optionally raw feature dicts) with LRU eviction once the
+    stored payloads exceed max_size bytes. Safe to open from several worker processes at once.
+    """
+
+    def __init__(self, path, extractor, max_size=DEFAULT_MAX_SIZE, store_raw=False):
+        self.extractor = extractor
+        self.version = extractor_version(extractor)
+        self.max_size = max_size
+        self.store_raw = store_raw
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # What the extractor's budget cut from the last sample, like extractor.truncated ([] on a hit,
+        # since cut results are never stored)
+        self.truncated = []
+
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            " sha256 TEXT NOT NULL, version TEXT NOT NULL, lite BLOB, raw TEXT,"
+            " size INTEGER NOT NULL, last_used INTEGER NOT NULL,"
+            " PRIMARY KEY (sha256, version))"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS features_last_used ON features (last_used)")
+        self.db.execute("DELETE FROM features WHERE version != ?", (self.version,))
+        self._refresh_size()
+        if self.size > self.max_size:
+            self._evict()
+
+    def _refresh_size(self):
+        self.size, self._clock = self.db.execute(
+            "SELECT COALESCE(SUM(size), 0), COALESCE(MAX(last_used), 0) FROM features").fetchone()
+        self._puts = 0
+
+    def _tick(self):
+        self._clock += 1
+        return self._clock
+
+    def get(self, sha256, need_raw=False):
+        """(lite vector or None, raw dict or None) for a cached sample, None on a miss. Without
+        need_raw a hit needs the lite vector, with it the raw dict"""
+        row = self.db.execute(
+            "SELECT lite, raw FROM features WHERE sha256 = ? AND version = ?", (sha256, self.version)).fetchone()
+        if row is None or row[1 if need_raw else 0] is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.db.execute("UPDATE features SET last_used = ? WHERE sha256 = ? AND version = ?",
+                        (self._tick(), sha256, self.version))
+        lite = np.frombuffer(row[0], dtype=np.float32).copy() if row[0] is not None else None
+        return lite, json.loads(row[1]) if row[1] is not None else None
+
+    def put(self, sha256, lite=None, raw=None):
+        """Stores whichever of the lite vector / raw dict is given, keeping the other part of an
+        existing entry"""
+        lite_blob = np.asarray(lite, dtype=np.float32).tobytes() if lite is not None else None
+        raw_json = json.dumps(raw) if raw is not None and self.store_raw else None
+        if lite_blob is None and raw_json is None:
+            return
+        size = (len(lite_blob) if lite_blob is not None else 0) + (len(raw_json) if raw_json is not None else 0)
+        self.db.execute(
+            "INSERT INTO features VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (sha256, version) DO UPDATE SET"
+            " lite = COALESCE(excluded.lite, lite), raw = COALESCE(excluded.raw, raw),"
+            " size = COALESCE(length(COALESCE(excluded.lite, lite)), 0) + COALESCE(length(COALESCE(excluded.raw, raw)), 0),"
+            " last_used = excluded.last_used",
+            (sha256, self.version, lite_blob, raw_json, size, self._tick()))
+        self.size += size
+        self._puts += 1
+        if self._puts >= SIZE_REFRESH:
+            self._refresh_size()
+        if self.size > self.max_size:
+            self._evict()
+
+    def _evict(self):
+        # Drop the least recently used entries until the store is 10% under the cap
+        self._refresh_size()
+        target = int(self.max_size * 0.9)
+        while self.size > target:
+            rows = self.db.execute(
+                "SELECT rowid, size FROM features ORDER BY last_used LIMIT 1024").fetchall()
+            if not rows:
+                break
+            drop, freed = [], 0
+            for rowid, size in rows:
+                if self.size - freed <= target:
+                    break
+                drop.append((rowid,))
+                freed += size
+            self.db.executemany("DELETE FROM features WHERE rowid = ?", drop)
+            self.size -= freed
+            self.evictions += len(drop)
+
+    @staticmethod
+    def key(bytez, file_size=None):
+        """sha256 of the sample. A truncated sample also carries its on-disk size, which the
+        features depend on"""
+        sha256 = hashlib.sha256(bytez).hexdigest()
+        if file_size is not None and file_size != len(bytez):
+            sha256 += f":{file_size}"
+        return sha256
+
+    def lite_vector(self, bytez, file_size=None):
+        """extractor.lite_vector(bytez, file_size), from the cache when the sample was seen before"""
+        sha256 = self.key(bytez, file_size)
+        cached = self.get(sha256)
+        if cached is not None:
+            self.truncated = []
+            return cached[0]
+        lite = self.extractor.lite_vector(bytez, file_size)
+        self.truncated = list(self.extractor.truncated)
+        if not self.truncated:
+            self.put(sha256, lite)
+        return lite
+
+    def raw_features(self, bytez, file_size=None):
+        """extractor.raw_features(bytez, file_size), from the cache when the cache was opened with
+        store_raw=True and the sample was seen before"""
+        sha256 = self.key(bytez, file_size)
+        if self.store_raw:
+            cached = self.get(sha256, need_raw=True)
+            if cached is not None:
+                self.truncated = []
+                return cached[1]
+        raw = self.extractor.raw_features(bytez, file_size)
+        self.truncated = list(self.extractor.truncated)
+        if not self.truncated:
+            self.put(sha256, raw=raw)
+        return raw
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": self.size,
+            "version": self.version,
+        }
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,109 @@
+'''
+Dense feature hashing for the PE extractor. Gives the same rows as
+sklearn's FeatureHasher(n_features, ...).transform([x]).toarray()[0], but writes
+straight into a NumPy buffer instead of building a FeatureHasher and a sparse
+matrix for every file, and memoizes the hash of recurring tokens
+(dll:function names, standard section names, Rich comp-ids).
+'''
+from itertools import islice
+
+import numpy as np
+from sklearn.utils import murmurhash3_32
+
+TOKEN_CACHE_SIZE = 1 << 17
+
+
+def token_slot(token, n_features):
+    """(index, sign) FeatureHasher assigns to a feature name"""
+    h = murmurhash3_32(token, seed=0)
+    if h == -2147483648:
+        # FeatureHasher's definition of abs(-2**31) % n_features
+        return (2147483647 - (n_features - 1)) % n_features, -1
+    return abs(h) % n_features, 1 if h >= 0 else -1
+
+
+class TokenTable(dict):
+    """
+    Bounded memo of token -> (index + 1) * sign for one n_features. Lookups go through
+    dict.__getitem__ so a whole token list is resolved at C speed; when the table is full
+    the least recently added half is dropped.
+    """
+
+    def __init__(self, n_features, max_size=TOKEN_CACHE_SIZE):
+        super().__init__()
+        self.n_features = n_features
+        self.max_size = max_size
+        self.lookups = 0
+        self.misses = 0
+
+    def __missing__(self, token):
+        self.misses += 1
+        if len(self) >= self.max_size:
+            for key in list(islice(self, self.max_size // 2)):
+                del self[key]
+        idx, sign = token_slot(token, self.n_features)
+        code = (idx + 1) * sign
+        self[token] = code
+        return code
+
+    def codes(self, tokens):
+        codes = np.fromiter(map(self.__getitem__, tokens), dtype=np.int64)
+        self.lookups += len(codes)
+        return codes
+
+
+_tables = {}
+
+
+def token_table(n_features):
+    table = _tables.get(n_features)
+    if table is None:
+        table = _tables[n_features] = TokenTable(n_features)
+    return table
+
+
+def hash_strings(tokens, n_features, alternate_sign=True, out=None):
+    """Same as FeatureHasher(n_features, input_type="string", alternate_sign=alternate_sign).transform([tokens])"""
+    if out is None:
+        out = np.zeros(n_features, dtype=np.float64)
+    codes = token_table(n_features).codes(tokens)
+    if len(codes):
+        weights = np.sign(codes).astype(np.float64) if alternate_sign else None
+        out += np.bincount(np.abs(codes) - 1, weights=weights, minlength=n_features)
+    return out
+
+
+def hash_pairs(pairs, n_features, alternate_sign=True, out=None):
+    """Same as FeatureHasher(n_features, input_type="pair", alternate_sign=alternate_sign).transform([pairs])"""
+    if out is None:
+        out = np.zeros(n_features, dtype=np.float64)
+    names = []
+    values = []
+    for name, value in pairs:
+        if isinstance(value, str):
+            name, value = f"{name}={value}", 1
+        if value == 0:
+            continue
+        names.append(name)
+        values.append(value)
+    if names:
+        codes = token_table(n_features).codes(names)
+        weights = np.array(values, dtype=np.float64)
+        if alternate_sign:
+            weights *= np.sign(codes)
+        out += np.bincount(np.abs(codes) - 1, weights=weights, minlength=n_features)
+    return out
+
+
+def cache_stats():
+    """Hit/miss counts of the token memos, per n_features"""
+    stats = {}
+    for n_features, table in sorted(_tables.items()):
+        hits = table.lookups - table.misses
+        stats[n_features] = {
+            "hits": hits,
+            "misses": table.misses,
+            "size": len(table),
+            "hit_rate": hits / table.lookups if table.lookups else 0.0,
+        }
+    return stats
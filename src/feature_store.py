@@ -0,0 +1,238 @@
+'''
+Persistent store of the feature matrices train.py extracts from the EMBER JSONL shards. Each shard's
+float32 FEATURE_COLS matrix and labels are saved as .npy files next to a manifest.json that records
+the source shard (path, size, mtime, content sha256) and the store version, a hash of FEATURE_COLS
+and the extractor source. Later runs memory-map the matrices instead of re-parsing the JSON; a shard
+is only re-extracted when it changed, and everything is dropped when the features change.
+
+    store = FeatureStore("../data/feature_store")
+    for path, X, y in load_shards(store, paths, workers=8):
+        ...
+'''
+import os
+import json
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import config
+import extractor_json
+import shard_reader
+
+MANIFEST = "manifest.json"
+HASH_CHUNK = 1024 * 1024
+
+
+def store_version(labels=(0, 1)):
+    """Hash of everything that changes the stored matrices: the column layout, the extractor and
+    shard reader source, the config sets the extractor reads and the labels that are kept"""
+    h = hashlib.sha256()
+    spec = {
+        "feature_cols": config.FEATURE_COLS,
+        "raw_cols": config.RAW_COLS_NEEDED,
+        "hdr_opt_fields": config.HDR_OPT_FIELDS,
+        "hdr_opt_aliases": config.HDR_OPT_ALIASES,
+        "standard_sec_names": sorted(config.STANDARD_SEC_NAMES),
+        "gui_dlls": sorted(config.GUI_DLLS),
+        "crt_prefixes": list(config.CRT_PREFIXES),
+        "labels": None if labels is None else sorted(labels),
+    }
+    h.update(json.dumps(spec).encode())
+    for module in (extractor_json, shard_reader):
+        with open(module.__file__, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def extract_shard(path, batch_size=shard_reader.BATCH_SIZE, labels=(0, 1)):
+    """(X, y) float32 FEATURE_COLS matrix and labels of the rows of a JSONL shard whose label is in
+    labels, streamed batch by batch"""
+    X_parts, y_parts = [], []
+    for batch in shard_reader.iter_batches(path, batch_size, config.RAW_COLS_NEEDED, labels):
+        X_parts.append(extractor_json.extract_batch_features(batch))
+        y_parts.append(np.array([record.get("label", np.nan) for record in batch], dtype=np.float32))
+        del batch
+    if not X_parts:
+        return np.zeros((0, len(config.FEATURE_COLS)), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(X_parts), np.concatenate(y_parts)
+
+
+def _extract_shard_job(path, batch_size, labels):
+    # stat and hash before extracting, so a shard rewritten meanwhile is not recorded as current
+    st = os.stat(path)
+    sha256 = file_sha256(path)
+    X, y = extract_shard(path, batch_size, labels)
+    return X, y, st, sha256
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class FeatureStore:
+    """
+    Directory of per-shard (X, y) .npy files and their manifest. open() returns read-only memmaps
+    of an up to date shard, write() stores a freshly extracted one. Not safe for concurrent writers.
+    """
+
+    def __init__(self, root, labels=(0, 1)):
+        self.root = root
+        self.labels = labels
+        self.version = store_version(labels)
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(root, exist_ok=True)
+        self.manifest = {"version": self.version, "feature_cols": config.FEATURE_COLS, "shards": {}}
+        path = os.path.join(root, MANIFEST)
+        if os.path.exists(path):
+            with open(path, encoding="utf8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == self.version:
+                self.manifest = manifest
+            else:
+                # written by another extractor version, none of it is valid any more
+                for entry in manifest.get("shards", {}).values():
+                    self._remove_files(entry)
+                self._save_manifest()
+
+    def _save_manifest(self):
+        path = os.path.join(self.root, MANIFEST)
+        with open(path + ".tmp", "w", encoding="utf8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _remove_files(self, entry):
+        for key in ("x", "y"):
+            try:
+                os.remove(os.path.join(self.root, entry[key]))
+            except (KeyError, OSError):
+                pass
+
+    def _lookup(self, path):
+        """Manifest entry of path if it still describes the shard on disk, else None"""
+        entry = self.manifest["shards"].get(os.path.abspath(path))
+        if entry is None:
+            return None
+        st = os.stat(path)
+        if st.st_size != entry["size"]:
+            return None
+        if st.st_mtime_ns != entry["mtime_ns"]:
+            # touched but maybe not changed: the content hash decides
+            if file_sha256(path) != entry["sha256"]:
+                return None
+            entry["mtime_ns"] = st.st_mtime_ns
+            self._save_manifest()
+        if not all(os.path.exists(os.path.join(self.root, entry[key])) for key in ("x", "y")):
+            return None
+        return entry
+
+    def open(self, path):
+        """(X, y) memory-mapped read-only for an up to date shard, None if it has to be extracted"""
+        entry = self._lookup(path)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._map(entry)
+
+    def _map(self, entry):
+        X = np.load(os.path.join(self.root, entry["x"]), mmap_mode="r")
+        y = np.load(os.path.join(self.root, entry["y"]), mmap_mode="r")
+        return X, y
+
+    def write(self, path, X, y, st=None, sha256=None):
+        """Stores the matrices extracted from the shard at path and returns them memory-mapped.
+        st / sha256 are the shard's stat and hash taken before extraction (computed now if None)"""
+        X = np.asarray(X, dtype=np.float32)
+        y = np.asarray(y, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != len(config.FEATURE_COLS) or len(y) != len(X):
+            raise ValueError(f"Expected an (n, {len(config.FEATURE_COLS)}) matrix and n labels, "
+                             f"got {X.shape} and {y.shape}")
+        abspath = os.path.abspath(path)
+        st = st or os.stat(path)
+        sha256 = sha256 or file_sha256(path)
+        stem = os.path.splitext(os.path.basename(path))[0]
+        name = f"{stem}-{hashlib.sha256(abspath.encode()).hexdigest()[:12]}"
+        entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256, "rows": len(X),
+                 "x": f"{name}.X.npy", "y": f"{name}.y.npy"}
+        for key, array in (("x", X), ("y", y)):
+            target = os.path.join(self.root, entry[key])
+            with open(target + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(target + ".tmp", target)
+        self.manifest["shards"][abspath] = entry
+        self._save_manifest()
+        return self._map(entry)
+
+    def load(self, path, extract):
+        """(X, y) of the shard at path, from the store or from extract(path) -> (X, y)"""
+        cached = self.open(path)
+        if cached is not None:
+            return cached
+        # stat and hash before extracting, so a shard rewritten meanwhile is not recorded as current
+        st = os.stat(path)
+        sha256 = file_sha256(path)
+        X, y = extract(path)
+        return self.write(path, X, y, st, sha256)
+
+    def prune(self, keep):
+        """Drops the shards whose path is not in keep. Returns how many were dropped"""
+        keep = {os.path.abspath(p) for p in keep}
+        dropped = [p for p in self.manifest["shards"] if p not in keep]
+        for p in dropped:
+            self._remove_files(self.manifest["shards"].pop(p))
+        if dropped:
+            self._save_manifest()
+        return len(dropped)
+
+    def stats(self):
+        return {"shards": len(self.manifest["shards"]), "hits": self.hits, "misses": self.misses,
+                "rows": sum(e["rows"] for e in self.manifest["shards"].values())}
+
+
+def load_shards(store, paths, workers=None, max_in_flight=None, batch_size=shard_reader.BATCH_SIZE):
+    """
+    Yields (path, X, y) for every shard in paths, in order. Shards in the store are memory-mapped;
+    the others are extracted by a pool of workers (default: all cores, 0: in this process) that
+    send back only the float32 arrays, and written to the store by this process. At most
+    max_in_flight shards (default 2 per worker) are queued or held at once, which bounds memory.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 0:
+        for path in paths:
+            cached = store.open(path)
+            if cached is None:
+                X, y, st, sha256 = _extract_shard_job(path, batch_size, store.labels)
+                cached = store.write(path, X, y, st, sha256)
+            yield (path,) + cached
+        return
+
+    max_in_flight = max_in_flight or 2 * workers
+    path_iter = iter(paths)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()  # (path, cached (X, y) or the future extracting it)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_in_flight:
+                path = next(path_iter, None)
+                if path is None:
+                    exhausted = True
+                    break
+                cached = store.open(path)
+                if cached is None:
+                    cached = pool.submit(_extract_shard_job, path, batch_size, store.labels)
+                pending.append((path, cached))
+            if not pending:
+                break
+
+            path, cached = pending.popleft()
+            if not isinstance(cached, tuple):
+                cached = store.write(path, *cached.result())
+            yield (path,) + cached
@@ -0,0 +1,128 @@
+'''
+Cached binary artifacts of the LightGBM text models. The first load of a model compiles it with
+tree_compiler and writes its node arrays as .npy files to a "<model>.compiled" directory next to
+it, with a meta.json recording the source model (size, mtime, sha256) and the compiler version.
+Later loads memory-map those arrays instead of parsing the text: the load itself reads only
+meta.json and the .npy headers, and the node arrays are paged in by the first prediction, which
+also builds the model's child and missing-value tables from them. The artifact is rebuilt when the model file or the compiler changes. The model's
+feature_names are checked against config.FEATURE_COLS on every load.
+
+    model = load_model("../model/ember_tuned_2026_fpr.txt")
+    y_prob = model.predict(X[:, model.columns])
+'''
+import os
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+
+import tree_compiler
+from config import FEATURE_COLS
+from tree_compiler import ARRAY_FIELDS, CompiledModel
+
+ARTIFACT_SUFFIX = ".compiled"
+META = "meta.json"
+HASH_CHUNK = 1024 * 1024
+
+
+def compiler_version():
+    """Hash of the tree_compiler source, which decides the layout of the stored arrays"""
+    with open(tree_compiler.__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def file_sha256(path):
+    # same as feature_store.file_sha256, without importing the extractor stack on a scan job's start-up
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def check_features(feature_names, feature_cols=FEATURE_COLS):
+    """Positions of the model's features in feature_cols; ValueError naming any that are missing"""
+    unknown = [name for name in feature_names if name not in feature_cols]
+    if unknown:
+        raise ValueError(f"{len(unknown)} model features are not in FEATURE_COLS: {unknown[:10]}")
+    if len(set(feature_names)) != len(feature_names):
+        raise ValueError("The model has duplicate feature names")
+    return [feature_cols.index(name) for name in feature_names]
+
+
+def artifact_dir(path):
+    return path + ARTIFACT_SUFFIX
+
+
+def _read_meta(path):
+    """meta.json of path's artifact if it still describes the model on disk and this compiler"""
+    meta_path = os.path.join(artifact_dir(path), META)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, encoding="utf8") as f:
+        meta = json.load(f)
+    st = os.stat(path)
+    if meta.get("compiler") != compiler_version() or meta.get("size") != st.st_size:
+        return None
+    if meta.get("mtime_ns") != st.st_mtime_ns:
+        # touched but maybe not changed: the content hash decides
+        if meta.get("sha256") != file_sha256(path):
+            return None
+        meta["mtime_ns"] = st.st_mtime_ns
+        try:
+            with open(meta_path, "w", encoding="utf8") as f:
+                json.dump(meta, f)
+        except OSError:
+            pass
+    return meta
+
+
+def build_artifact(path):
+    """Compiles the text model at path and (re)writes its artifact. Returns the compiled model"""
+    st = os.stat(path)
+    sha256 = file_sha256(path)
+    model = CompiledModel.from_text(path)
+    target = artifact_dir(path)
+    tmp = target + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name in ARRAY_FIELDS:
+        np.save(os.path.join(tmp, f"{name}.npy"), getattr(model, name))
+    meta = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": sha256, "compiler": compiler_version(),
+            "feature_names": model.feature_names, "objective": model.objective, "sigmoid": model.sigmoid,
+            "average_output": model.average_output, "num_trees": model.num_trees}
+    with open(os.path.join(tmp, META), "w", encoding="utf8") as f:
+        json.dump(meta, f)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    return model
+
+
+def load_model(path, feature_cols=FEATURE_COLS, cache=True):
+    """
+    CompiledModel of the text model at path, from its artifact when up to date. The load is
+    described in model.load_info (source "artifact" / "compiled", seconds). With feature_cols set,
+    model.columns holds the position of each model feature in it (ValueError if one is missing);
+    pass feature_cols=None for models with other inputs (the SOREL models' Column_i).
+    When the artifact can't be written (read-only directory) the model is compiled in memory.
+    """
+    start = time.perf_counter()
+    meta = _read_meta(path) if cache else None
+    if meta is not None:
+        root = artifact_dir(path)
+        arrays = {name: np.load(os.path.join(root, f"{name}.npy"), mmap_mode="r") for name in ARRAY_FIELDS}
+        model = CompiledModel(**arrays, feature_names=meta["feature_names"], objective=meta["objective"],
+                              sigmoid=meta["sigmoid"], average_output=meta["average_output"])
+        source = "artifact"
+    else:
+        try:
+            model = build_artifact(path) if cache else CompiledModel.from_text(path)
+        except OSError as e:
+            print(f" [!] Could not write the model artifact for {path}: {e}")
+            model = CompiledModel.from_text(path)
+        source = "compiled"
+    model.columns = check_features(model.feature_names, feature_cols) if feature_cols is not None else None
+    model.load_info = {"path": path, "source": source, "seconds": time.perf_counter() - start}
+    return model
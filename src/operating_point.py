@@ -0,0 +1,164 @@
+'''
+Exact operating-point selection for the binary models. Scores are reduced once to the positive and
+negative weight at every distinct score; cumulative sums of those give TP / FP / FN / TN at every
+threshold in O(n log n), instead of one confusion matrix per hand-picked threshold. A sample is
+predicted malicious when score >= threshold, as everywhere else in the repo. Scores can be fed in
+chunks, so tens of millions of them never have to be sorted at once.
+
+    curve = OperatingCurve.from_scores(y_val, y_val_prob)
+    point = curve.best_threshold(max_fpr=TARGET_FPR)
+    print(point["threshold"], point["recall"], point["fpr"])
+'''
+import numpy as np
+import pandas as pd
+
+CHUNK_SIZE = 1 << 22
+# FPR budgets the scripts report the best operating point for
+REPORT_FPRS = [0.001, 0.005, 0.01, 0.02, 0.05, 0.10, 0.20]
+
+
+class OperatingCurve:
+    """
+    Positive / negative weight per distinct score. Labels other than 0 and 1 are ignored, and NaN
+    scores count as predicted benign at every threshold.
+    """
+
+    def __init__(self):
+        self.scores = np.zeros(0, dtype=np.float64)  # ascending, distinct
+        self.pos = np.zeros(0, dtype=np.float64)
+        self.neg = np.zeros(0, dtype=np.float64)
+        self.nan_pos = 0.0
+        self.nan_neg = 0.0
+        self.weighted = False
+
+    @classmethod
+    def from_scores(cls, y_true, scores, weights=None, chunk_size=CHUNK_SIZE):
+        curve = cls()
+        for start in range(0, len(scores), chunk_size):
+            end = start + chunk_size
+            curve.update(y_true[start:end], scores[start:end], None if weights is None else weights[start:end])
+        return curve
+
+    def update(self, y_true, scores, weights=None):
+        """Adds a chunk of labels, scores and optional sample weights"""
+        y = np.asarray(y_true)
+        s = np.asarray(scores, dtype=np.float64)
+        if weights is None:
+            w = np.ones(len(s), dtype=np.float64)
+        else:
+            w = np.asarray(weights, dtype=np.float64)
+            self.weighted = True
+        if not (len(y) == len(s) == len(w)):
+            raise ValueError(f"Got {len(y)} labels, {len(s)} scores and {len(w)} weights")
+        pos_w = np.where(y == 1, w, 0.0)
+        neg_w = np.where(y == 0, w, 0.0)
+        nan = np.isnan(s)
+        if nan.any():
+            self.nan_pos += pos_w[nan].sum()
+            self.nan_neg += neg_w[nan].sum()
+            s, pos_w, neg_w = s[~nan], pos_w[~nan], neg_w[~nan]
+
+        u, inv = np.unique(np.concatenate([self.scores, s]), return_inverse=True)
+        self.pos = np.bincount(inv, weights=np.concatenate([self.pos, pos_w]), minlength=len(u))
+        self.neg = np.bincount(inv, weights=np.concatenate([self.neg, neg_w]), minlength=len(u))
+        self.scores = u
+        return self
+
+    @property
+    def total_pos(self):
+        return self.pos.sum() + self.nan_pos
+
+    @property
+    def total_neg(self):
+        return self.neg.sum() + self.nan_neg
+
+    def counts(self):
+        """(thresholds, tp, fp, fn, tn) at every distinct score, highest threshold first"""
+        thresholds = self.scores[::-1]
+        tp = np.cumsum(self.pos[::-1])
+        fp = np.cumsum(self.neg[::-1])
+        return thresholds, tp, fp, self.total_pos - tp, self.total_neg - fp
+
+    def table(self):
+        """Confusion counts and rates at every distinct threshold, highest first"""
+        thresholds, tp, fp, fn, tn = self.counts()
+        p, n = self.total_pos, self.total_neg
+        with np.errstate(invalid="ignore", divide="ignore"):
+            df = pd.DataFrame({
+                "threshold": thresholds, "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+                "tpr": tp / p if p else np.zeros_like(tp),
+                "fpr": fp / n if n else np.zeros_like(fp),
+                "precision": np.where(tp + fp > 0, tp / (tp + fp), 1.0),
+            })
+        df["recall"] = df["tpr"]
+        return df
+
+    def roc(self):
+        """ROC table, starting from the (fpr=0, tpr=0) point of a threshold above every score"""
+        df = self.table()[["threshold", "fpr", "tpr"]]
+        return pd.concat([pd.DataFrame({"threshold": [np.inf], "fpr": [0.0], "tpr": [0.0]}), df],
+                         ignore_index=True)
+
+    def pr(self):
+        """Precision / recall table, highest threshold first"""
+        return self.table()[["threshold", "recall", "precision"]]
+
+    def auc(self):
+        """Area under the ROC curve (ties contribute a diagonal segment, like roc_auc_score)"""
+        roc = self.roc()
+        return float(np.trapezoid(roc["tpr"], roc["fpr"]) if hasattr(np, "trapezoid")
+                     else np.trapz(roc["tpr"], roc["fpr"]))
+
+    def average_precision(self):
+        """Step-wise average precision, like sklearn's average_precision_score"""
+        pr = self.pr()
+        recall = np.concatenate([[0.0], pr["recall"].to_numpy()])
+        return float(np.sum(np.diff(recall) * pr["precision"].to_numpy()))
+
+    def _point(self, threshold, tp, fp):
+        p, n = self.total_pos, self.total_neg
+        fn, tn = p - tp, n - fp
+        count = float if self.weighted else int
+        return {
+            "threshold": float(threshold),
+            "tp": count(tp), "fp": count(fp), "fn": count(fn), "tn": count(tn),
+            "recall": float(tp / p) if p else 0.0,
+            "fpr": float(fp / n) if n else 0.0,
+            "fnr": float(fn / p) if p else 0.0,
+            "precision": float(tp / (tp + fp)) if tp + fp else 1.0,
+        }
+
+    def at_threshold(self, threshold):
+        """Confusion counts and rates when score >= threshold is called malicious"""
+        i = np.searchsorted(self.scores, threshold, side="left")
+        return self._point(threshold, self.pos[i:].sum(), self.neg[i:].sum())
+
+    def best_threshold(self, max_fpr):
+        """
+        The exact threshold with the highest recall whose FPR is at most max_fpr; of the thresholds
+        reaching that recall, the one with the lowest FPR (the highest). None when no threshold
+        flags anything without going over max_fpr.
+        """
+        thresholds, tp, fp, fn, tn = self.counts()
+        n = self.total_neg
+        fpr = fp / n if n else np.zeros_like(fp)
+        feasible = np.flatnonzero(fpr <= max_fpr)
+        if len(feasible) == 0:
+            return None
+        # tp and fpr only grow as the threshold drops, so the last feasible threshold has the best
+        # recall, and the first threshold with that tp the lowest FPR
+        best = np.searchsorted(tp, tp[feasible[-1]], side="left")
+        if tp[best] == 0:
+            return None
+        return self._point(thresholds[best], tp[best], fp[best])
+
+    def at_fpr(self, fprs):
+        """Best operating point for each FPR budget, as a table"""
+        rows = [dict(max_fpr=f, **(self.best_threshold(f) or {})) for f in fprs]
+        return pd.DataFrame(rows)
+
+
+def format_point(point):
+    """One-line summary of an operating point"""
+    return (f"thresh={point['threshold']:.6f}  recall={point['recall']:.4f}  FPR={point['fpr']:.4f}  "
+            f"FNR={point['fnr']:.4f}  TP={point['tp']:g} FN={point['fn']:g} FP={point['fp']:g}")
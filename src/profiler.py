@@ -0,0 +1,161 @@
+'''
+Opt-in per-stage profiling of PEFeatureExtractor. Records wall time, CPU time and (optionally)
+the tracemalloc peak of pefile parsing and of every FeatureType, per file, and aggregates them into
+latency histograms and a slowest-files report. Pass an ExtractionProfiler to PEFeatureExtractor to
+enable it; without one the extractor runs its usual code path.
+
+    profiler = ExtractionProfiler(trace_memory=True)
+    extractor = PEFeatureExtractor(profiler=profiler)
+    ...
+    print(profiler.report())
+    profiler.dump("profile.json")
+'''
+import bisect
+import hashlib
+import heapq
+import json
+import time
+import tracemalloc
+
+# Upper edges of the latency histogram buckets, in ms (the last bucket is open ended)
+HIST_EDGES_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500]
+
+
+class StageStats:
+    """Running totals and latency histogram of one stage"""
+
+    def __init__(self):
+        self.count = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.wall_max = 0.0
+        self.mem_peak_max = 0
+        self.histogram = [0] * (len(HIST_EDGES_MS) + 1)
+
+    def add(self, wall, cpu, mem_peak):
+        self.count += 1
+        self.wall += wall
+        self.cpu += cpu
+        self.wall_max = max(self.wall_max, wall)
+        self.mem_peak_max = max(self.mem_peak_max, mem_peak)
+        self.histogram[bisect.bisect_left(HIST_EDGES_MS, wall * 1000)] += 1
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "wall_total_s": self.wall,
+            "cpu_total_s": self.cpu,
+            "wall_mean_ms": 1000 * self.wall / self.count if self.count else 0.0,
+            "wall_max_ms": 1000 * self.wall_max,
+            "mem_peak_max_bytes": self.mem_peak_max,
+            "histogram_ms": {
+                (f"<={edge}" if i < len(HIST_EDGES_MS) else f">{HIST_EDGES_MS[-1]}"): n
+                for i, (edge, n) in enumerate(zip(HIST_EDGES_MS + [None], self.histogram))
+            },
+        }
+
+
+class ExtractionProfiler:
+    """
+    Collects per-stage timings. The extractor calls start_file(), measure() for each stage and
+    end_file(); stages are named after the FeatureType (plus "parse" for pefile). With
+    trace_memory=True the peak traced allocation of every stage is recorded too, which slows
+    extraction down noticeably.
+    """
+
+    def __init__(self, trace_memory=False, slowest=20):
+        self.trace_memory = trace_memory
+        self.n_slowest = slowest
+        self.stages = {}
+        self.files = 0
+        self._slowest = []  # min-heap of (wall, order, record)
+        self._file_stages = None
+        self._file_start = 0.0
+        self._started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def stop(self):
+        """Stops tracemalloc if this profiler started it"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+            self.trace_memory = False
+
+    def start_file(self):
+        self._file_stages = {}
+        self._file_start = time.perf_counter()
+
+    def measure(self, stage, fn, *args):
+        """fn(*args), recording its wall time, CPU time and allocation peak under stage"""
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            mem_start = tracemalloc.get_traced_memory()[0]
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            mem_peak = tracemalloc.get_traced_memory()[1] - mem_start if self.trace_memory else 0
+            stats = self.stages.get(stage)
+            if stats is None:
+                stats = self.stages[stage] = StageStats()
+            stats.add(wall, cpu, mem_peak)
+            if self._file_stages is not None:
+                self._file_stages[stage] = self._file_stages.get(stage, 0.0) + wall
+
+    def end_file(self, bytez, file_size=None):
+        """Closes the current file. The sha256 is only computed for files that make the slowest-N list"""
+        wall = time.perf_counter() - self._file_start
+        self.files += 1
+        stats = self.stages.get("total")
+        if stats is None:
+            stats = self.stages["total"] = StageStats()
+        stats.add(wall, 0.0, 0)
+
+        if self.n_slowest > 0 and (len(self._slowest) < self.n_slowest or wall > self._slowest[0][0]):
+            record = {
+                "sha256": hashlib.sha256(bytez).hexdigest(),
+                "size": len(bytez) if file_size is None else file_size,
+                "wall_ms": 1000 * wall,
+                "stages_ms": {k: 1000 * v for k, v in self._file_stages.items()},
+            }
+            item = (wall, self.files, record)
+            if len(self._slowest) < self.n_slowest:
+                heapq.heappush(self._slowest, item)
+            else:
+                heapq.heapreplace(self._slowest, item)
+        self._file_stages = None
+
+    def slowest(self):
+        """Records of the slowest files, slowest first"""
+        return [record for _, _, record in sorted(self._slowest, reverse=True)]
+
+    def summary(self):
+        return {
+            "files": self.files,
+            "trace_memory": self.trace_memory,
+            "stages": {name: stats.to_dict() for name, stats in self.stages.items()},
+            "slowest": self.slowest(),
+        }
+
+    def report(self):
+        lines = [f"[*] Profiled {self.files} files",
+                 f"    {'stage':<22s} {'count':>7s} {'mean ms':>9s} {'max ms':>9s} {'total s':>9s} {'cpu s':>8s} {'peak KB':>9s}"]
+        stages = sorted(self.stages.items(), key=lambda kv: kv[0] == "total")
+        for name, s in stages:
+            mean = 1000 * s.wall / s.count if s.count else 0.0
+            lines.append(f"    {name:<22s} {s.count:>7d} {mean:>9.2f} {1000 * s.wall_max:>9.2f} "
+                         f"{s.wall:>9.2f} {s.cpu:>8.2f} {s.mem_peak_max / 1024:>9.1f}")
+        lines.append(f"[*] Slowest {len(self._slowest)} files")
+        for record in self.slowest():
+            top = max(record["stages_ms"].items(), key=lambda kv: kv[1], default=("-", 0.0))
+            lines.append(f"    {record['wall_ms']:>9.2f} ms  {record['sha256']}  {record['size']:>11,d} B"
+                         f"  (slowest stage: {top[0]} {top[1]:.2f} ms)")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(self.summary(), f, indent=2)
@@ -2,8 +2,9 @@ import pandas as pd
 import lightgbm as lgb
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.metrics import confusion_matrix
 from config import FEATURE_COLS, SEED, IMPORT_DROPOUT_RATE
+from model_artifact import build_artifact, load_model
+from operating_point import OperatingCurve, REPORT_FPRS, format_point
 
 TARGET_FPR = 0.10
 
@@ -80,6 +81,13 @@ for feat, direction in [
 # PARAMS FOR FINE TUNING
 BASE_MODEL_PATH = "../model/ember_lite_model_2024_v3.txt"
 
+# init_model only adds trees; they must read the same columns in the same order
+base_model = load_model(BASE_MODEL_PATH)
+if base_model.feature_names != feat_cols:
+    raise ValueError(f"{BASE_MODEL_PATH} was trained on different features than the {len(feat_cols)} "
+                     f"FEATURE_COLS found in the data: {base_model.feature_names[:5]}... vs {feat_cols[:5]}...")
+print(f"[*] Base model: {BASE_MODEL_PATH} ({base_model.num_trees} trees, {len(feat_cols)} features)")
+
 params = {
     'objective': 'binary',
     'metric': ['auc', 'binary_logloss'], # Actually track the performance
@@ -109,32 +117,24 @@ tuned_model = lgb.train(
 )
 
 y_val_prob = tuned_model.predict(X_val)
-best_thresh = None
-best_recall = -1.0
-
-print("\n[*] Validation threshold sweep (target low FPR)...")
-for thresh in [0.95, 0.90, 0.85, 0.80, 0.75, 0.70, 0.65, 0.60, 0.55, 0.50, 0.45, 0.40, 0.35, 0.30]:
-    y_pred = (y_val_prob >= thresh).astype(int)
-    tn, fp, fn, tp = confusion_matrix(y_val, y_pred, labels=[0, 1]).ravel()
-    recall = tp / (tp + fn) if (tp + fn) else 0
-    fpr = fp / (fp + tn) if (fp + tn) else 0
-    print(f"  thresh={thresh:.2f} recall={recall:.4f} FPR={fpr:.4f} TP={tp} FP={fp}")
-
-    if fpr <= TARGET_FPR and recall > best_recall:
-        best_recall = recall
-        best_thresh = thresh
-
-if best_thresh is not None:
-    y_best = (y_val_prob >= best_thresh).astype(int)
-    tn, fp, fn, tp = confusion_matrix(y_val, y_best, labels=[0, 1]).ravel()
-    best_fpr = fp / (fp + tn) if (fp + tn) else 0
-    best_fnr = fn / (fn + tp) if (fn + tp) else 0
-    print(f"[*] Selected threshold @ target FPR {TARGET_FPR:.2f}: {best_thresh:.2f}")
-    print(f"[*] Selected metrics -> FPR={best_fpr:.4f} FNR={best_fnr:.4f} TP={tp} FP={fp}")
+curve = OperatingCurve.from_scores(y_val, y_val_prob)
+
+print("\n[*] Validation operating points (target low FPR)...")
+for max_fpr in REPORT_FPRS:
+    point = curve.best_threshold(max_fpr)
+    if point is not None:
+        print(f"  FPR<={max_fpr:.3f} {format_point(point)}")
+
+best = curve.best_threshold(TARGET_FPR)
+if best is not None:
+    print(f"[*] Selected threshold @ target FPR {TARGET_FPR:.2f}: {best['threshold']:.6f}")
+    print(f"[*] Selected metrics -> FPR={best['fpr']:.4f} FNR={best['fnr']:.4f} TP={best['tp']} FP={best['fp']}")
 else:
     print(f"[*] No threshold met target FPR <= {TARGET_FPR:.2f} on validation.")
 
 # SAVE
 SAVE_PATH = "../model/ember_tuned_2026_v3.txt"
 tuned_model.save_model(SAVE_PATH)
-print(f"\n[+] Fine-tuning complete. Saved as {SAVE_PATH}")
\ No newline at end of file
+print(f"\n[+] Fine-tuning complete. Saved as {SAVE_PATH}")
+build_artifact(SAVE_PATH)
+print(f"[+] Compiled artifact → {SAVE_PATH}.compiled")
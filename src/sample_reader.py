@@ -0,0 +1,46 @@
+'''
+Memory-mapped sample reader. Maps the file read-only and hands the extractor at most MAX_BYTES of
+it, the same truncation the gateway applies, without reading the rest of large installers from
+disk. The true size comes from stat, for the features that describe the whole file (gen_size,
+overlay size).
+'''
+import os
+import mmap
+import traceback
+
+from config import MAX_BYTES
+
+
+class MappedSample:
+    """
+    Read-only view of a file on disk. data is an mmap of the first max_bytes bytes (the whole file
+    if max_bytes is None) that pefile, NumPy and hashlib all take without copying; size is the size
+    of the file. Use as a context manager, or call close().
+
+        with MappedSample(path) as sample:
+            vector = extractor.lite_vector(sample.data, sample.size)
+    """
+
+    def __init__(self, path, max_bytes=MAX_BYTES):
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            length = self.size if max_bytes is None else min(self.size, max_bytes)
+            # mmap can't map an empty file
+            self.data = mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ) if length else b""
+        self.truncated = length < self.size
+
+    def close(self):
+        """Unmaps the file. Raises BufferError while a view of data (a NumPy array, a memoryview)
+        is still alive; PEFeatureExtractor releases its own views before returning"""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if tb is not None:
+            # The frames of a failed extraction still hold its views of data; drop their locals so
+            # the map can close and the original error is the one raised
+            traceback.clear_frames(tb)
+        self.close()
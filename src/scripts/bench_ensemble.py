@@ -0,0 +1,73 @@
+'''
+Times ModelEnsemble.score_matrix over every model in a directory at batch sizes 1, 64 and 4096,
+scoring each model with its own Booster (the default), with its own CompiledModel, and through the
+merged CompiledModel forest (merged=True), and checks that all three give the same scores. Rows are random; models whose features
+are not in FEATURE_COLS read a random matrix of their own width.
+
+Usage: python bench_ensemble.py [model_dir]
+'''
+import os
+import sys
+import glob
+import time
+
+import numpy as np
+import lightgbm as lgb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FEATURE_COLS
+from ensemble import ModelEnsemble
+from model_artifact import check_features, load_model
+
+MODEL_DIR = "../../common_folder"
+BATCH_SIZES = (1, 64, 4096)
+REPEAT = 5
+
+
+def best_time(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def build(paths, how):
+    """Ensemble of the models, scored by their Boosters ("booster"), one CompiledModel predict per
+    model ("compiled") or the merged forest ("merged")"""
+    ensemble = ModelEnsemble(merged=how == "merged")
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            check_features(lgb.Booster(model_file=path).feature_name())
+            source = None
+        except ValueError:
+            source = "other"
+        ensemble.add(name, load_model(path, feature_cols=None) if how == "compiled" else path, source=source)
+    return ensemble
+
+
+def main():
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else MODEL_DIR
+    paths = sorted(glob.glob(os.path.join(model_dir, "*model*.txt")))
+    if not paths:
+        print(f" [!] No models found in {model_dir}")
+        sys.exit(1)
+    ensembles = {how: build(paths, how) for how in ("booster", "compiled", "merged")}
+    print(f"[*] {len(paths)} models: {', '.join(ensembles['booster'].names)}")
+
+    rng = np.random.default_rng(0)
+    print(f"[*] {'batch':>6} {'Boosters ms':>12} {'compiled ms':>12} {'merged ms':>10}  max score diff")
+    for n in BATCH_SIZES:
+        X = rng.random((n, len(FEATURE_COLS))).astype(np.float32)
+        inputs = {source: rng.random((n, cols)).astype(np.float32)
+                  for source, cols in ensembles["booster"].input_cols.items()}
+        scores = [ensemble.score_matrix(X, inputs) for ensemble in ensembles.values()]
+        diff = max(np.abs(scores[0] - other).max() for other in scores[1:])
+        times = [best_time(lambda: ensemble.score_matrix(X, inputs)) * 1e3 for ensemble in ensembles.values()]
+        print(f"    {n:>6} {times[0]:>12.2f} {times[1]:>12.2f} {times[2]:>10.2f}  {diff:.2e}")
+
+
+if __name__ == "__main__":
+    main()
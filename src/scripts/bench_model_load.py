@@ -0,0 +1,66 @@
+'''
+Reports the load time of every LightGBM text model in a directory three ways: lgb.Booster parsing
+the text, the first load_model() (compile + write the artifact) and a cached load_model() (memory-
+mapped artifact), plus the first prediction after the cached load. Also shows whether each model's
+feature_names check out against FEATURE_COLS and that the cached model scores like the Booster.
+
+Usage: python bench_model_load.py [model_dir]
+'''
+import os
+import sys
+import glob
+import time
+
+import numpy as np
+import lightgbm as lgb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_artifact import artifact_dir, build_artifact, check_features, load_model
+
+MODEL_DIR = "../../common_folder"
+REPEAT = 5
+
+
+def best_time(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    model_dir = sys.argv[1] if len(sys.argv) > 1 else MODEL_DIR
+    paths = sorted(glob.glob(os.path.join(model_dir, "*model*.txt")))
+    if not paths:
+        print(f" [!] No models found in {model_dir}")
+        sys.exit(1)
+
+    print(f"[*] {'model':<32} {'Booster ms':>10} {'compile ms':>10} {'cached ms':>10} "
+          f"{'1st pred ms':>11}  features")
+    for path in paths:
+        booster_time = best_time(lambda: lgb.Booster(model_file=path))
+        compile_time = best_time(lambda: build_artifact(path))
+        cached_time = best_time(lambda: load_model(path, feature_cols=None))
+
+        model = load_model(path, feature_cols=None)
+        assert model.load_info["source"] == "artifact"
+        X = np.random.default_rng(0).random((64, model.num_features)).astype(np.float32)
+        start = time.perf_counter()
+        y_prob = model.predict(X)
+        first_pred = time.perf_counter() - start
+        parity = np.allclose(y_prob, lgb.Booster(model_file=path).predict(X), rtol=0, atol=1e-12)
+        try:
+            check_features(model.feature_names)
+            features = f"{model.num_features} in FEATURE_COLS"
+        except ValueError:
+            features = f"{model.num_features}, not FEATURE_COLS"
+        print(f"    {os.path.basename(path):<32} {booster_time * 1e3:>10.1f} {compile_time * 1e3:>10.1f} "
+              f"{cached_time * 1e3:>10.2f} {first_pred * 1e3:>11.2f}  {features}"
+              + ("" if parity else "   [!] scores differ from Booster"))
+    print(f"[*] Artifacts are written next to each model, e.g. {artifact_dir(paths[0])}")
+
+
+if __name__ == "__main__":
+    main()
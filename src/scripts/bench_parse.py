@@ -0,0 +1,193 @@
+'''
+Benchmarks PEFeatureExtractor(minimal_parse=True) against pefile's full load on a synthetic PE corpus
+(imports, resource trees and relocation tables of increasing size), and checks that both give the
+same lite vectors and raw features.
+
+Usage: python bench_parse.py [dir of PE files]
+'''
+import os
+import sys
+import json
+import time
+import struct
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extractor_pe import PEFeatureExtractor
+
+REPEAT = 3
+FILE_ALIGNMENT = 0x200
+SECTION_ALIGNMENT = 0x1000
+SCN_CODE = 0x60000020  # code, execute, read
+SCN_DATA = 0x40000040  # initialized data, read
+SCN_DATA_DISCARDABLE = 0x42000040
+
+
+def align(n, a):
+    return (n + a - 1) // a * a
+
+
+def import_section(rva, n_dlls, n_funcs):
+    # descriptors, then per dll its lookup table and address table, then hint/name entries and dll names
+    desc_size = 20 * (n_dlls + 1)
+    thunk_size = 4 * (n_funcs + 1)
+    names_start = desc_size + 2 * thunk_size * n_dlls
+    names = bytearray()
+    descriptors = bytearray()
+    thunks = bytearray()
+    for d in range(n_dlls):
+        hint_rvas = []
+        for f in range(n_funcs):
+            hint_rvas.append(rva + names_start + len(names))
+            names += struct.pack("<H", f) + f"Func{d}_{f}".encode() + b"\x00"
+            if len(names) % 2:
+                names += b"\x00"
+        dll_rva = rva + names_start + len(names)
+        names += f"lib{d}.dll".encode() + b"\x00"
+        ilt_rva = rva + desc_size + 2 * thunk_size * d
+        table = struct.pack(f"<{n_funcs + 1}I", *hint_rvas, 0)
+        thunks += table + table
+        descriptors += struct.pack("<IIIII", ilt_rva, 0, 0, dll_rva, ilt_rva + thunk_size)
+    descriptors += b"\x00" * 20
+    return bytes(descriptors + thunks + names), desc_size
+
+
+def resource_section(rva, n_types, rng):
+    # root directory -> one id entry per type -> one name -> one language -> 64 bytes of data
+    root = struct.pack("<IIHHHH", 0, 0, 0, 0, 0, n_types)
+    offset = 16 + 8 * n_types
+    entries, body = bytearray(), bytearray()
+    for t in range(n_types):
+        type_dir = offset + len(body)
+        entries += struct.pack("<II", t + 1, 0x80000000 | type_dir)
+        lang_dir = type_dir + 24
+        data_entry = lang_dir + 24
+        data = data_entry + 16
+        body += struct.pack("<IIHHHH", 0, 0, 0, 0, 0, 1) + struct.pack("<II", 1, 0x80000000 | lang_dir)
+        body += struct.pack("<IIHHHH", 0, 0, 0, 0, 0, 1) + struct.pack("<II", 0x409, data_entry)
+        body += struct.pack("<IIII", rva + data, 64, 0, 0)
+        body += rng.integers(0, 256, 64, dtype=np.uint8).tobytes()
+    return root + bytes(entries) + bytes(body)
+
+
+def reloc_section(n_blocks, n_entries):
+    blocks = bytearray()
+    for b in range(n_blocks):
+        blocks += struct.pack("<II", SECTION_ALIGNMENT * (b + 1), 8 + 2 * n_entries)
+        blocks += struct.pack(f"<{n_entries}H", *[(3 << 12) | ((4 * e) & 0xFFF) for e in range(n_entries)])
+    return bytes(blocks)
+
+
+def synthetic_pe(n_dlls, n_funcs, n_resources, n_reloc_blocks, rng):
+    """A well-formed PE32 with a code section and import, resource and relocation sections"""
+    text_vsize = max(n_reloc_blocks, 1) * SECTION_ALIGNMENT
+    text = rng.integers(0, 256, 4096, dtype=np.uint8).tobytes()
+    sections = []  # (name, data, virtual size, characteristics)
+    rva = SECTION_ALIGNMENT
+    sections.append((b".text", text, text_vsize, SCN_CODE))
+    rva += align(text_vsize, SECTION_ALIGNMENT)
+    idata, import_size = import_section(rva, n_dlls, n_funcs)
+    sections.append((b".idata", idata, len(idata), SCN_DATA))
+    import_rva = rva
+    rva += align(len(idata), SECTION_ALIGNMENT)
+    rsrc = resource_section(rva, n_resources, rng)
+    sections.append((b".rsrc", rsrc, len(rsrc), SCN_DATA))
+    rsrc_rva = rva
+    rva += align(len(rsrc), SECTION_ALIGNMENT)
+    reloc = reloc_section(n_reloc_blocks, 64)
+    sections.append((b".reloc", reloc, len(reloc), SCN_DATA_DISCARDABLE))
+    reloc_rva = rva
+    image_size = rva + align(len(reloc), SECTION_ALIGNMENT)
+
+    headers_size = 0x400
+    directories = [(0, 0)] * 16
+    directories[1] = (import_rva, import_size)
+    directories[2] = (rsrc_rva, len(rsrc))
+    directories[5] = (reloc_rva, len(reloc))
+
+    section_table = bytearray()
+    raw = bytearray()
+    offset = headers_size
+    vaddr = SECTION_ALIGNMENT
+    for name, data, vsize, chars in sections:
+        raw_size = align(len(data), FILE_ALIGNMENT)
+        section_table += struct.pack("<8sIIIIIIHHI", name, vsize, vaddr, raw_size, offset, 0, 0, 0, 0, chars)
+        raw += data + b"\x00" * (raw_size - len(data))
+        offset += raw_size
+        vaddr += align(vsize, SECTION_ALIGNMENT)
+
+    optional = struct.pack(
+        "<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII",
+        0x10B, 14, 0, len(text), len(raw) - len(text), 0, SECTION_ALIGNMENT, SECTION_ALIGNMENT, 0,
+        0x400000, SECTION_ALIGNMENT, FILE_ALIGNMENT, 6, 0, 0, 0, 6, 0, 0, image_size, headers_size, 0,
+        2, 0x8140, 0x100000, 0x1000, 0x100000, 0x1000, 0, 16,
+    ) + b"".join(struct.pack("<II", *d) for d in directories)
+    coff = struct.pack("<HHIIIHH", 0x14C, len(sections), 0x5F000000, 0, 0, len(optional), 0x0102)
+    dos = b"MZ" + b"\x00" * 58 + struct.pack("<I", 0x40)
+    headers = dos + b"PE\x00\x00" + coff + optional + bytes(section_table)
+    return headers + b"\x00" * (headers_size - len(headers)) + bytes(raw)
+
+
+def synthetic_corpus():
+    rng = np.random.default_rng(42)
+    for n_dlls, n_funcs, n_resources, n_relocs in [(4, 20, 8, 4), (16, 50, 64, 32), (32, 100, 512, 256),
+                                                   (8, 40, 2048, 16), (8, 40, 16, 1024)]:
+        name = f"synthetic imp={n_dlls}x{n_funcs} rsrc={n_resources} reloc={n_relocs}"
+        yield name, synthetic_pe(n_dlls, n_funcs, n_resources, n_relocs, rng)
+
+
+def file_samples(path):
+    for root, _, names in os.walk(path):
+        for name in sorted(names):
+            with open(os.path.join(root, name), "rb") as f:
+                bytez = f.read()
+            if bytez:
+                yield name, bytez
+
+
+def best_time(fn, *args):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    full = PEFeatureExtractor()
+    minimal = PEFeatureExtractor(minimal_parse=True)
+    samples = list(synthetic_corpus())
+    if len(sys.argv) > 1:
+        samples += list(file_samples(sys.argv[1]))
+
+    print(f"{'sample':<48s} {'size':>10s} {'full parse':>11s} {'lite parse':>11s} {'raw parse':>10s} "
+          f"{'full lite':>10s} {'min lite':>9s}")
+    totals = np.zeros(5)
+    n_diff = 0
+    for name, bytez in samples:
+        if not np.array_equal(full.lite_vector(bytez), minimal.lite_vector(bytez), equal_nan=True) or \
+                json.dumps(full.raw_features(bytez)) != json.dumps(minimal.raw_features(bytez)):
+            n_diff += 1
+            print(f" [!] Features differ: {name}")
+        times = np.array([
+            best_time(full.parse, bytez),
+            best_time(minimal.parse, bytez, True),
+            best_time(minimal.parse, bytez),
+            best_time(full.lite_vector, bytez),
+            best_time(minimal.lite_vector, bytez),
+        ])
+        totals += times
+        t = 1000 * times
+        print(f"{name[:48]:<48s} {len(bytez):>10,d} {t[0]:>9.2f}ms {t[1]:>9.2f}ms {t[2]:>8.2f}ms "
+              f"{t[3]:>8.2f}ms {t[4]:>7.2f}ms")
+
+    t = 1000 * totals
+    print(f"[*] Total: full parse {t[0]:.1f} ms, minimal (lite) {t[1]:.1f} ms ({totals[0] / totals[1]:.1f}x), "
+          f"minimal (raw) {t[2]:.1f} ms ({totals[0] / totals[2]:.1f}x)")
+    print(f"[*] lite_vector: full {t[3]:.1f} ms, minimal {t[4]:.1f} ms ({totals[3] / totals[4]:.1f}x)")
+    print(f"[*] Samples with different features: {n_diff}/{len(samples)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+'''
+Benchmarks the memoized stable_hash_bin against hashing every Rich header comp-id, on the Rich
+headers of an EMBER JSONL shard, and checks that both give the same bins. With a second argument
+the comp-ids seen are written there as a precomputed table (HASH_BIN_CACHE.load_table()).
+
+Usage: python bench_rich_hash.py <shard.jsonl> [table.json]
+'''
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extractor_json import HASH_BIN_CACHE, HashBinCache, _hash_bin, stable_hash_bin
+from shard_reader import iter_records
+
+RICH_BINS = 8
+REPEAT = 3
+
+
+def comp_ids(path):
+    ids = []
+    for record in iter_records(path, ["rich_header", "richheader", "rich"], labels=None):
+        for rich_obj in record.values():
+            values = rich_obj.get("values", rich_obj.get("raw", [])) if isinstance(rich_obj, dict) else rich_obj
+            if isinstance(values, list):
+                ids.extend(values[0:len(values) // 2 * 2:2])
+            break
+    return ids
+
+
+def best_time(fn, ids):
+    best = float("inf")
+    for _ in range(REPEAT):
+        HASH_BIN_CACHE.clear()
+        start = time.perf_counter()
+        for value in ids:
+            fn(value, RICH_BINS)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    ids = comp_ids(sys.argv[1])
+    print(f"[*] {len(ids):,} comp-id lookups, {len(set(map(str, ids))):,} distinct")
+
+    mismatches = sum(stable_hash_bin(v, RICH_BINS) != _hash_bin(str(v), RICH_BINS) for v in ids)
+    print(f"[*] Bins differing from the uncached hash: {mismatches}")
+
+    uncached = best_time(lambda v, bins: _hash_bin(str(v), bins), ids)
+    cached = best_time(stable_hash_bin, ids)
+    print(f"    uncached  {uncached * 1e9 / max(len(ids), 1):>8.1f} ns/lookup")
+    print(f"    memoized  {cached * 1e9 / max(len(ids), 1):>8.1f} ns/lookup  ({uncached / cached:.1f}x)")
+    print(f"[*] Cache stats (last pass): {HASH_BIN_CACHE.stats()}")
+
+    if len(sys.argv) > 2:
+        HASH_BIN_CACHE.save_table(sys.argv[2], ids, RICH_BINS)
+        shipped = HashBinCache()
+        n = shipped.load_table(sys.argv[2])
+        same = all(shipped.lookup(v, RICH_BINS) == _hash_bin(str(v), RICH_BINS) for v in ids)
+        print(f"[*] Wrote {n:,} entries to {sys.argv[2]}; table lookups identical: {same}, "
+              f"table hit rate {shipped.stats()['hit_rate']:.3f}")
+
+
+if __name__ == "__main__":
+    main()
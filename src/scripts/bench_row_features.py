@@ -0,0 +1,71 @@
+'''
+Benchmarks extract_batch_features against the row-wise path train.py used (DataFrame.apply with
+result_type="expand", then pd.to_numeric per column) on an EMBER JSONL shard, and checks that both
+give the same float32 matrix.
+
+Usage: python bench_row_features.py <shard.jsonl> [batch size]
+'''
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FEATURE_COLS, RAW_COLS_NEEDED
+from extractor_json import extract_row_features, extract_batch_features
+from shard_reader import iter_batches
+
+REPEAT = 3
+
+
+def apply_path(batch):
+    shard = pd.DataFrame(batch)
+    rows = shard.apply(extract_row_features, axis=1, result_type="expand")
+    for col in rows.columns:
+        rows[col] = pd.to_numeric(rows[col], errors="coerce").astype(np.float32)
+    return rows[FEATURE_COLS].values
+
+
+def dict_path(batch):
+    rows = pd.DataFrame([extract_row_features(record) for record in batch])
+    for col in rows.columns:
+        rows[col] = pd.to_numeric(rows[col], errors="coerce").astype(np.float32)
+    return rows[FEATURE_COLS].values
+
+
+def best_time(fn, batches):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for batch in batches:
+            fn(batch)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    batches = list(iter_batches(sys.argv[1], batch_size, RAW_COLS_NEEDED, labels=None))
+    n_rows = sum(len(b) for b in batches)
+    print(f"[*] {n_rows:,} rows in {len(batches)} batches of up to {batch_size:,}")
+
+    expected = np.vstack([apply_path(b) for b in batches])
+    actual = np.vstack([extract_batch_features(b) for b in batches])
+    diff = ~((expected == actual) | (np.isnan(expected) & np.isnan(actual)))
+    for col in np.nonzero(diff.any(axis=0))[0]:
+        print(f" [!] {FEATURE_COLS[col]} differs on {diff[:, col].sum()} rows")
+    print(f"[*] Matrices identical: {not diff.any()}")
+
+    base = None
+    for name, fn in [("apply + expand", apply_path), ("dict per row", dict_path), ("extract_batch_features", extract_batch_features)]:
+        t = best_time(fn, batches)
+        base = base or t
+        print(f"    {name:<24s} {t:>8.3f} s  {n_rows / t:>12,.0f} rows/s  {base / t:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+'''
+Benchmarks CompiledModel against lgb.Booster on a LightGBM text model: start-up time (text parse,
+compile, .npz load) and prediction latency / throughput at batch sizes 1, 64 and 4096, and checks
+that both give the same raw scores and leaves. Rows are synthetic, drawn around the model's own
+split thresholds with some NaNs and zeros, so every branch and missing-value rule is exercised.
+
+Usage: python bench_tree_predict.py <model.txt> [rows]
+'''
+import os
+import sys
+import time
+import tempfile
+
+import numpy as np
+import lightgbm as lgb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tree_compiler import CompiledModel
+
+BATCH_SIZES = [1, 64, 4096]
+REPEAT = 3
+
+
+def synthetic_rows(model, n, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.random((n, model.num_features))
+    for j in range(model.num_features):
+        thresholds = model.threshold[model.feature == j]
+        if len(thresholds):
+            X[:, j] = rng.choice(thresholds, n) * rng.choice([0.99, 1.0, 1.01, -1.0, 0.5, 2.0], n)
+    X[rng.random(X.shape) < 0.05] = np.nan
+    X[rng.random(X.shape) < 0.05] = 0.0
+    return X.astype(np.float32)
+
+
+def best_time(fn):
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    path = sys.argv[1]
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 8192
+
+    booster_load = best_time(lambda: lgb.Booster(model_file=path))
+    compile_time = best_time(lambda: CompiledModel.from_text(path))
+    booster = lgb.Booster(model_file=path)
+    model = CompiledModel.from_text(path)
+    with tempfile.TemporaryDirectory() as tmp:
+        npz = os.path.join(tmp, "model.npz")
+        model.save(npz)
+        npz_load = best_time(lambda: CompiledModel.load(npz))
+        model = CompiledModel.load(npz)
+    print(f"[*] {os.path.basename(path)}: {model.num_trees} trees, {len(model.feature):,} splits, "
+          f"{model.num_features} features")
+    print(f"    Booster(model_file)  {booster_load * 1e3:>8.1f} ms")
+    print(f"    from_text            {compile_time * 1e3:>8.1f} ms")
+    print(f"    load(.npz)           {npz_load * 1e3:>8.1f} ms")
+
+    X = synthetic_rows(model, rows)
+    raw_equal = np.array_equal(booster.predict(X, raw_score=True), model.predict(X, raw_score=True))
+    prob_diff = np.abs(booster.predict(X) - model.predict(X)).max()
+    leaf_offsets = np.concatenate([[0], np.cumsum([t["num_leaves"] for t in booster.dump_model()["tree_info"]])[:-1]])
+    leaves_equal = np.array_equal(booster.predict(X, pred_leaf=True), model.leaves(X) - leaf_offsets)
+    print(f"[*] Parity on {rows:,} rows: raw scores identical {raw_equal}, leaves identical {leaves_equal}, "
+          f"max probability diff {prob_diff:.2e}")
+
+    print(f"[*] {'batch':>6}  {'Booster ms':>11}  {'compiled ms':>11}  {'Booster rows/s':>15}  "
+          f"{'compiled rows/s':>15}")
+    for batch in BATCH_SIZES:
+        chunks = [X[i:i + batch] for i in range(0, min(rows, max(batch * 16, batch)), batch)]
+        t_booster = best_time(lambda: [booster.predict(c) for c in chunks]) / len(chunks)
+        t_compiled = best_time(lambda: [model.predict(c) for c in chunks]) / len(chunks)
+        print(f"    {batch:>6}  {t_booster * 1e3:>11.3f}  {t_compiled * 1e3:>11.3f}  "
+              f"{batch / t_booster:>15,.0f}  {batch / t_compiled:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
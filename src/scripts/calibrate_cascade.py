@@ -0,0 +1,85 @@
+'''
+Calibrates the uncertainty band of a two-stage cascade (fast model first, full model only for
+uncertain files) on a validation set, then reports the per-stage hit rates, the cascade's FPR and
+recall against the full model alone, and the scoring time of both. The band is written to a JSON
+file for the scan jobs.
+
+The validation set is an .npz with y and either X (both models read the same columns) or X_fast
+and X_full (e.g. SOREL feature vectors for the fast model, FEATURE_COLS for the full one). A
+FEATURE_COLS matrix is narrowed to the columns a model was trained on.
+
+Usage: python calibrate_cascade.py <val.npz> [fast_model.txt] [full_model.txt] [threshold] [band.json]
+'''
+import os
+import sys
+import json
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cascade import CascadeScorer
+from config import FEATURE_COLS
+from tree_compiler import CompiledModel
+
+FAST_MODEL_PATH = "../../common_folder/sorel_lite_model_v12.txt"
+FULL_MODEL_PATH = "../../common_folder/ember_lite_model_2024.txt"
+THRESHOLD = 0.5
+BAND_FILE = "cascade_band.json"
+
+
+def model_columns(model, X):
+    """X as the model's feature_names when X holds all FEATURE_COLS and the model reads a subset"""
+    if X.shape[1] == model.num_features or X.shape[1] != len(FEATURE_COLS):
+        return X
+    return X[:, [FEATURE_COLS.index(name) for name in model.feature_names]]
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    fast_path = sys.argv[2] if len(sys.argv) > 2 else FAST_MODEL_PATH
+    full_path = sys.argv[3] if len(sys.argv) > 3 else FULL_MODEL_PATH
+    threshold = float(sys.argv[4]) if len(sys.argv) > 4 else THRESHOLD
+    band_file = sys.argv[5] if len(sys.argv) > 5 else BAND_FILE
+
+    with np.load(sys.argv[1]) as data:
+        y = data["y"]
+        X_fast = data["X_fast"] if "X_fast" in data else data["X"]
+        X_full = data["X_full"] if "X_full" in data else data["X"]
+    print(f"[*] Validation rows: {len(y):,}  (fast: {X_fast.shape[1]} features, full: {X_full.shape[1]})")
+
+    cascade = CascadeScorer(CompiledModel.from_text(fast_path), CompiledModel.from_text(full_path),
+                            threshold=threshold)
+    X_fast = model_columns(cascade.fast, X_fast)
+    X_full = model_columns(cascade.full, X_full)
+    report = cascade.calibrate(y, X_fast, X_full)
+    print(f"[*] Band: escalate {report['low']:.6f} <= fast score < {report['high']:.6f}  "
+          f"(escalation rate {report['escalation_rate']:.4f})")
+    print(f"    full model  recall={report['full_recall']:.4f}  FPR={report['full_fpr']:.4f}")
+    print(f"    cascade     recall={report['cascade_recall']:.4f}  FPR={report['cascade_fpr']:.4f}")
+
+    start = time.perf_counter()
+    cascade.full.predict(X_full)
+    full_time = time.perf_counter() - start
+    cascade.reset_stats()
+    start = time.perf_counter()
+    verdicts = cascade.predict(X_fast, X_full)
+    cascade_time = time.perf_counter() - start
+    stats = cascade.stats()
+    print(f"[*] Stage hit rates: fast benign {stats['fast_benign_rate']:.4f}, "
+          f"fast malicious {stats['fast_malicious_rate']:.4f}, escalated {stats['escalated_rate']:.4f}")
+    print(f"[*] Scoring time: full model {full_time:.3f}s, cascade {cascade_time:.3f}s "
+          f"({full_time / max(cascade_time, 1e-9):.1f}x)")
+    agree = (verdicts == (cascade.full.predict(X_full) >= threshold)).mean()
+    print(f"[*] Verdicts identical to the full model on {agree:.4f} of the rows")
+
+    with open(band_file, "w", encoding="utf8") as f:
+        json.dump({"fast_model": os.path.basename(fast_path), "full_model": os.path.basename(full_path),
+                   **report}, f, indent=2)
+    print(f"[*] Band saved to {band_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+'''
+Checks AuthenticodeSignature on signed PE files: the signature must parse with the installed signify
+(num_certs > 0, no parse_error), lite_vector() must give the same auth_* columns as raw_features(),
+and the second extraction of a file must come from the certificate-table cache.
+
+Usage: python check_authenticode.py <signed PE> [...]
+'''
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FEATURE_COLS
+from extractor_pe import PEFeatureExtractor
+
+LITE_AUTH = [("auth_num_certs", "num_certs"), ("auth_self_signed", "self_signed"),
+             ("auth_parse_error", "parse_error"), ("auth_chain_depth", "chain_max_depth"),
+             ("auth_no_countersigner", "no_countersigner")]
+
+
+def check(extractor, path):
+    """List of problems with the Authenticode features of one signed file"""
+    with open(path, "rb") as f:
+        bytez = f.read()
+    auth = extractor._by_name["authenticode"]
+    problems = []
+
+    misses = auth.cache_misses
+    raw = extractor.raw_features(bytez)["authenticode"]
+    if raw.get("num_certs", 0) < 1:
+        problems.append(f"no signature found: {raw}")
+    if raw.get("parse_error"):
+        problems.append("parse_error set")
+    if auth.cache_misses != misses + 1:
+        problems.append("the first extraction did not parse the certificate table")
+
+    hits = auth.cache_hits
+    lite = extractor.lite_vector(bytez)
+    if auth.cache_hits != hits + 1:
+        problems.append("the second extraction did not hit the certificate-table cache")
+    for col, key in LITE_AUTH:
+        if lite[FEATURE_COLS.index(col)] != float(raw[key]):
+            problems.append(f"{col}: lite={lite[FEATURE_COLS.index(col)]} raw={raw[key]}")
+    return problems
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    extractor = PEFeatureExtractor()
+    failed = 0
+    for path in sys.argv[1:]:
+        problems = check(extractor, path)
+        if problems:
+            failed += 1
+            print(f" [!] {path}")
+            for problem in problems:
+                print(f"     {problem}")
+        else:
+            print(f"[*] OK: {path}")
+    print(f"[*] Signed files checked: {len(sys.argv) - 1}, failed: {failed}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
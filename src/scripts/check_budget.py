@@ -0,0 +1,139 @@
+'''
+Checks ExtractionBudget on a synthetic PE with a huge import table: the budgeted extraction must
+cut the imports while pefile reads them and finish within max_seconds, and FeatureCache must not
+store the cut vector, so a later unbudgeted run on the same file gets the full one. Files given on
+the command line must come out of a default budget exactly as without one.
+
+Usage: python check_budget.py [dir or file] [...]
+'''
+import os
+import sys
+import time
+import struct
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from extractor_pe import PEFeatureExtractor, ExtractionBudget
+from feature_cache import FeatureCache
+from check_lite_parity import iter_files
+
+NUM_DLLS = 64
+IMPORTS_PER_DLL = 4000
+BUDGET = ExtractionBudget(max_seconds=0.5, max_imports=512)
+
+
+def import_table_pe(num_dlls, per_dll):
+    """PE32 with one section holding num_dlls import descriptors of per_dll ordinal imports each"""
+    section_rva, raw_offset = 0x1000, 0x200
+    descriptors_size = 20 * (num_dlls + 1)
+    names_rva = section_rva + descriptors_size
+    names = b"".join(b"lib%05d.dll\0" % i for i in range(num_dlls))
+    thunks_rva = (names_rva + len(names) + 3) & ~3
+    thunks_size = 4 * (per_dll + 1)
+    data = bytearray(thunks_rva - section_rva + num_dlls * thunks_size)
+    data[names_rva - section_rva:names_rva - section_rva + len(names)] = names
+    ordinals = [0x80000000 | (j + 1) for j in range(per_dll)]
+    for i in range(num_dlls):
+        thunks = thunks_rva + i * thunks_size
+        struct.pack_into("<IIIII", data, 20 * i, thunks, 0, 0, names_rva + 12 * i, thunks)
+        struct.pack_into(f"<{per_dll}I", data, thunks - section_rva, *ordinals)
+    raw_size = (len(data) + 0x1ff) & ~0x1ff
+    data += bytes(raw_size - len(data))
+
+    directories = [(0, 0)] * 16
+    directories[1] = (section_rva, descriptors_size)
+    optional = struct.pack(
+        "<HBBIIIIIIIIIHHHHHHIIIIHHIIIIII", 0x10b, 0, 0, 0, raw_size, 0, section_rva, section_rva, section_rva,
+        0x400000, 0x1000, 0x200, 4, 0, 0, 0, 4, 0, 0, section_rva + ((raw_size + 0xfff) & ~0xfff), 0x200, 0, 2, 0,
+        0x100000, 0x1000, 0x100000, 0x1000, 0, 16) + b"".join(struct.pack("<II", *d) for d in directories)
+    headers = (b"MZ" + bytes(58) + struct.pack("<I", 0x40)
+               + struct.pack("<4sHHIIIHH", b"PE\0\0", 0x14c, 1, 0, 0, 0, len(optional), 0x0102) + optional
+               + struct.pack("<8sIIIIIIHHI", b".idata", raw_size, section_rva, raw_size, raw_offset, 0, 0, 0, 0,
+                             0xC0000040))
+    return headers + bytes(raw_offset - len(headers)) + bytes(data)
+
+
+def check_import_cap(bytez):
+    problems = []
+    full = PEFeatureExtractor()
+    budgeted = PEFeatureExtractor(budget=BUDGET)
+
+    start = time.perf_counter()
+    full_imports = sum(len(entry.imports) for entry in full.parse(bytez).DIRECTORY_ENTRY_IMPORT)
+    full_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    pe = budgeted.parse(bytez)
+    budget_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    budgeted.lite_vector(bytez)
+    budget_lite = time.perf_counter() - start
+    print(f"[*] {NUM_DLLS * IMPORTS_PER_DLL:,} imports in the table, {full_imports:,} read by a full parse "
+          f"in {full_parse * 1e3:.1f} ms")
+    print(f"[*] Budgeted parse {budget_parse * 1e3:.1f} ms, lite_vector {budget_lite * 1e3:.1f} ms "
+          f"(max_seconds {BUDGET.max_seconds}, max_imports {BUDGET.max_imports}), truncated: {budgeted.truncated}")
+
+    if f"imports>{BUDGET.max_imports}" not in budgeted.truncated:
+        problems.append("the import table was not cut")
+    if hasattr(pe, "DIRECTORY_ENTRY_IMPORT"):
+        problems.append("the cut import list was kept")
+    if budget_lite > BUDGET.max_seconds:
+        problems.append(f"lite_vector took {budget_lite:.2f}s, over max_seconds")
+    if budget_parse * 2 >= full_parse:
+        problems.append("the budgeted parse was not clearly faster than the full one")
+    return problems
+
+
+def check_cache(bytez):
+    problems = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "features.sqlite")
+        cache = FeatureCache(path, PEFeatureExtractor(budget=BUDGET), store_raw=True)
+        budget_lite = cache.lite_vector(bytez)
+        budget_raw = cache.raw_features(bytez)
+        cache.close()
+
+        cache = FeatureCache(path, PEFeatureExtractor(), store_raw=True)
+        full_lite = cache.lite_vector(bytez)
+        full_raw = cache.raw_features(bytez)
+        if cache.hits:
+            problems.append(f"the unbudgeted run got {cache.hits} cached results of the budgeted one")
+        cache.close()
+    if np.array_equal(budget_lite, full_lite, equal_nan=True):
+        problems.append("budgeted and unbudgeted lite vectors are the same")
+    if budget_raw["imports"] == full_raw["imports"]:
+        problems.append("budgeted and unbudgeted raw imports are the same")
+    return problems
+
+
+def check_unchanged(paths):
+    """Files within the default budget give the same vectors with and without it"""
+    full = PEFeatureExtractor()
+    budgeted = PEFeatureExtractor(budget=ExtractionBudget())
+    problems = []
+    n_files = 0
+    for path in iter_files(paths):
+        with open(path, "rb") as f:
+            bytez = f.read()
+        n_files += 1
+        lite = budgeted.lite_vector(bytez)
+        if not budgeted.truncated and not np.array_equal(lite, full.lite_vector(bytez), equal_nan=True):
+            problems.append(f"{path}: lite vector differs under the default budget")
+    print(f"[*] Files checked under the default budget: {n_files}")
+    return problems
+
+
+def main():
+    bytez = import_table_pe(NUM_DLLS, IMPORTS_PER_DLL)
+    problems = check_import_cap(bytez) + check_cache(bytez)
+    if len(sys.argv) > 1:
+        problems += check_unchanged(sys.argv[1:])
+    for problem in problems:
+        print(f" [!] {problem}")
+    print(f"[*] Budget checks {'failed' if problems else 'passed'}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
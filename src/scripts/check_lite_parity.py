@@ -0,0 +1,75 @@
+'''
+Checks PEFeatureExtractor.lite_vector() against the JSON path (raw_features -> extract_row_features)
+on a directory of PE files, and reports the per-file extraction time of both.
+
+Usage: python check_lite_parity.py <dir or file> [...]
+'''
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import FEATURE_COLS
+from extractor_pe import PEFeatureExtractor
+from extractor_json import extract_row_features
+
+
+def iter_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in sorted(names):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    extractor = PEFeatureExtractor()
+    json_time = lite_time = 0.0
+    n_files = n_mismatch = 0
+
+    for path in iter_files(sys.argv[1:]):
+        with open(path, "rb") as f:
+            bytez = f.read()
+        if not bytez:
+            continue
+
+        start = time.perf_counter()
+        row = extract_row_features(extractor.raw_features(bytez))
+        expected = pd.DataFrame([row])[FEATURE_COLS]
+        json_time += time.perf_counter() - start
+        for col in expected.columns:
+            expected[col] = pd.to_numeric(expected[col], errors="coerce").astype(np.float32)
+        expected = expected.values[0]
+
+        start = time.perf_counter()
+        actual = extractor.lite_vector(bytez)
+        lite_time += time.perf_counter() - start
+
+        n_files += 1
+        close = np.isclose(actual, expected, rtol=1e-6, equal_nan=True)
+        if not close.all():
+            n_mismatch += 1
+            print(f" [!] Mismatch: {path}")
+            for i in np.where(~close)[0]:
+                print(f"     {FEATURE_COLS[i]:<28s} json={expected[i]!r} lite={actual[i]!r}")
+
+    if not n_files:
+        print("[!] No files found.")
+        sys.exit(1)
+
+    print(f"[*] Files checked: {n_files}, mismatches: {n_mismatch}")
+    print(f"[*] JSON path: {1000 * json_time / n_files:.2f} ms/file")
+    print(f"[*] Lite path: {1000 * lite_time / n_files:.2f} ms/file")
+    sys.exit(1 if n_mismatch else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ import pyzipper
 API_KEY = "2720d9e74cb42303742ec32d5cc1a378d5e531ecb8f3a01e" #os.environ.get("MALWARE_BAZAAR_API_KEY").strip()
 BASE_DIR = r"C:\malware_bazaar"
 TARGET_TOTAL = 2000  # Set to daily limit to maximize without exceeding
+# Keep the password protected zips as downloaded; batch_extract.py featurizes them in memory.
+# Set to True to unpack the live samples to disk instead
+EXTRACT_SAMPLES = False
 FAMILIES = [
     "Akira",       # Consistent with common naming
     "Qilin",       # Active
@@ -97,8 +100,12 @@ def download_dataset():
                 file_res.raise_for_status()
                 
                 if file_res.content.startswith(b'PK'):
-                    with pyzipper.AESZipFile(io.BytesIO(file_res.content), mode='r') as z:
-                        z.extractall(path=family_dir, pwd=b'infected')
+                    if EXTRACT_SAMPLES:
+                        with pyzipper.AESZipFile(io.BytesIO(file_res.content), mode='r') as z:
+                            z.extractall(path=family_dir, pwd=b'infected')
+                    else:
+                        with open(os.path.join(family_dir, f"{sha256}.zip"), "wb") as f:
+                            f.write(file_res.content)
                     total_downloaded += 1
                     print(f" [OK] Saved: {sha256[:10]}... (Total: {total_downloaded})")
                 else:
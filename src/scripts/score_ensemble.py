@@ -0,0 +1,75 @@
+'''
+Scores an EMBER JSONL shard against every model in a directory in one pass: features are extracted
+once, all models are scored together, and the per-model score matrix plus the combined score is
+written to a CSV. With labels in the shard, AUC and the best operating point at TARGET_FPR are
+printed for every model and the ensemble. Models whose features are not in FEATURE_COLS (the SOREL
+models) are only scored when their feature vectors are given as an .npy aligned with the shard's
+labelled rows.
+
+Usage: python score_ensemble.py <shard.jsonl> [rule] [scores.csv] [sorel_features.npy]
+'''
+import os
+import sys
+import glob
+import time
+
+import numpy as np
+import lightgbm as lgb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ensemble import ModelEnsemble, RULES
+from feature_store import extract_shard
+from model_artifact import check_features
+from operating_point import OperatingCurve, format_point
+
+MODEL_DIR = "../../common_folder"
+TARGET_FPR = 0.01
+SCORES_FILE = "ensemble_scores.csv"
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    rule = sys.argv[2] if len(sys.argv) > 2 else "mean"
+    out_file = sys.argv[3] if len(sys.argv) > 3 else SCORES_FILE
+    sorel = np.load(sys.argv[4], mmap_mode="r") if len(sys.argv) > 4 else None
+    if rule not in RULES:
+        raise ValueError(f"Unknown rule {rule}, expected one of {RULES}")
+
+    start = time.perf_counter()
+    X, y = extract_shard(sys.argv[1])
+    print(f"[*] Extracted {len(X):,} rows once in {time.perf_counter() - start:.2f}s")
+
+    ensemble = ModelEnsemble()
+    for path in sorted(glob.glob(os.path.join(MODEL_DIR, "*model*.txt"))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        model = lgb.Booster(model_file=path)
+        try:
+            check_features(model.feature_name())
+            ensemble.add(name, model)
+        except ValueError:
+            if sorel is None:
+                print(f" [!] Skipping {name}: its features are not FEATURE_COLS and no SOREL vectors were given")
+                continue
+            ensemble.add(name, model, source="sorel")
+    print(f"[*] Registered {len(ensemble.members)} models: {', '.join(ensemble.names)}")
+
+    start = time.perf_counter()
+    scores = ensemble.score(X, {"sorel": sorel} if sorel is not None else None, rule=rule)
+    print(f"[*] Scored all models in one pass in {time.perf_counter() - start:.2f}s (rule: {rule})")
+
+    if len(np.unique(y)) == 2:
+        print(f"[*] {'model':<28} {'AUC':>7}  best point at FPR <= {TARGET_FPR}")
+        for name in scores.columns:
+            curve = OperatingCurve.from_scores(y, scores[name].to_numpy())
+            point = curve.best_threshold(TARGET_FPR)
+            print(f"    {name:<28} {curve.auc():>7.4f}  {format_point(point) if point else 'none'}")
+
+    scores.insert(0, "label", y)
+    scores.to_csv(out_file, index=False)
+    print(f"[*] Score matrix saved to {out_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+'''
+Streaming reader for EMBER-style JSONL shards. Every line is scanned for its top-level keys, and only
+the values of the keys in config.RAW_COLS_NEEDED are decoded; the large histogram, byteentropy and
+strings payloads are stepped over without building any Python objects. Records whose label is not
+wanted are dropped before anything but the label is decoded, and records come out in fixed-size
+batches, so a shard never has to fit in memory.
+'''
+import json
+import re
+
+from config import RAW_COLS_NEEDED
+
+BATCH_SIZE = 10000
+
+_WS = re.compile(r"\s*")
+_STRING = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_STRUCT = re.compile(r'[\[\]{}"]')
+_SCALAR_END = re.compile(r"[,}\]\s]")
+_decode = json.JSONDecoder().raw_decode
+
+
+def _skip_value(line, pos):
+    """End position of the JSON value starting at pos"""
+    c = line[pos]
+    if c == '"':
+        return _STRING.match(line, pos).end()
+    if c == "[" or c == "{":
+        depth = 0
+        m = _STRUCT.search(line, pos)
+        while m is not None:
+            ch = m.group()
+            if ch == '"':
+                pos = _STRING.match(line, m.start()).end()
+            else:
+                pos = m.end()
+                depth += 1 if ch == "[" or ch == "{" else -1
+                if depth == 0:
+                    return pos
+            m = _STRUCT.search(line, pos)
+        raise ValueError("Unterminated JSON value")
+    m = _SCALAR_END.search(line, pos)
+    return m.start() if m is not None else len(line)
+
+
+def select_keys(line, keys, labels=None):
+    """
+    Decodes the values of the wanted top-level keys of one JSON object. Wanted values are decoded
+    by json's C scanner as they are reached; the others are only stepped over. With labels set,
+    None is returned as soon as a label outside labels is seen (or if there is no label).
+    """
+    pos = _WS.match(line).end()
+    if line[pos] != "{":
+        raise ValueError("Shard line is not a JSON object")
+    values = {}
+    pos = _WS.match(line, pos + 1).end()
+    if line[pos] == "}":
+        return None if labels is not None else values
+    while True:
+        m = _STRING.match(line, pos)
+        if m is None:
+            raise ValueError(f"Expected a key at position {pos}")
+        key = m.group()[1:-1]
+        if "\\" in key:
+            key = json.loads(m.group())
+        pos = _WS.match(line, m.end()).end()
+        if line[pos] != ":":
+            raise ValueError(f"Expected ':' at position {pos}")
+        pos = _WS.match(line, pos + 1).end()
+        if key in keys:
+            values[key], pos = _decode(line, pos)
+            if key == "label" and labels is not None and values[key] not in labels:
+                return None
+        else:
+            pos = _skip_value(line, pos)
+        pos = _WS.match(line, pos).end()
+        if line[pos] == "}":
+            break
+        if line[pos] != ",":
+            raise ValueError(f"Expected ',' or '}}' at position {pos}")
+        pos = _WS.match(line, pos + 1).end()
+    if labels is not None and "label" not in values:
+        return None
+    return values
+
+
+def iter_records(path, keys=RAW_COLS_NEEDED, labels=(0, 1)):
+    """Dicts of the wanted keys of every record in a JSONL shard. With labels set, records whose
+    label is missing or not in labels are skipped (label is always decoded then)."""
+    keys = set(keys)
+    if labels is not None:
+        keys.add("label")
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = select_keys(line, keys, labels)
+            if record is not None:
+                yield record
+
+
+def iter_batches(path, batch_size=BATCH_SIZE, keys=RAW_COLS_NEEDED, labels=(0, 1)):
+    """Lists of up to batch_size records from iter_records"""
+    batch = []
+    for record in iter_records(path, keys, labels):
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -4,108 +4,72 @@ Training script for model
 # BASIC IMPORTS
 import os
 import numpy as np
-import pandas as pd
 import lightgbm as lgb
 import glob # Used for finding all JSONL files in the data directory
 import gc # Garbage collection to manage memory during training
 
-# SKLEARN IMPORTS
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import roc_auc_score, accuracy_score, confusion_matrix
-
 # LOCAL IMPORTS
-from config import FEATURE_COLS, MODEL_PATH, SEED, IMPORT_DROPOUT_RATE, RAW_COLS_NEEDED, MODEL_OUT
-from extractor_json import extract_row_features
+from config import FEATURE_COLS, MODEL_PATH, SEED, IMPORT_DROPOUT_RATE, MODEL_OUT
+from feature_store import FeatureStore, load_shards
+from train_dataset import ShardedTrainingData
+from model_artifact import build_artifact
+from operating_point import OperatingCurve, REPORT_FPRS, format_point
 
 DATA_DIR = "/kaggle/input/datasets/weiweip/ember2024/Win64_train"
-np.random.seed(SEED) # For reproducibility
+FEATURE_STORE_DIR = "feature_store" # extracted shard matrices, reused across runs
+DATASET_CACHE_DIR = "datasets" # binned LightGBM training sets, reused across runs
 
 TARGET_FPR = 0.10
 BENIGN_WEIGHT = 1.40
 HARD_BENIGN_WEIGHT = 2.25
+VAL_FRACTION = 0.15
+SHARD_BATCH_SIZE = 10000 # records per batch read from a shard
+INGEST_WORKERS = None # shard extraction processes (None: all cores, 0: in-process)
+INGEST_MAX_IN_FLIGHT = None # shards queued or held at once (None: 2 per worker)
 
 jsonl_files = sorted(glob.glob(os.path.join(DATA_DIR, "*.jsonl")))
 if not jsonl_files:
     raise FileNotFoundError(f"No JSONL file in the directory: {DATA_DIR}")
 
-processed_chunks = []
-# Read file in small chunks -> extract data -> free memory -> repeat, prevents OOM errors
-for file_path in jsonl_files:
-    print(f"Processing file: {file_path}...")
-    shard = pd.read_json(file_path, lines=True)
-    shard = shard[[c for c in RAW_COLS_NEEDED if c in shard.columns]] # Keep only needed raw columns
-    shard = shard[shard['label'].isin([0, 1])] # Filter out unlabeled data (label == -1)
-    
-    # apply feature extraction to shard and expand dicts into columns and add label back into the resulting dataframe
-    rows = shard.apply(extract_row_features, axis=1, result_type="expand")
-    rows["label"] = shard["label"].values
-    
-    # delete shard and run garabage collection to free memory before next iteration
-    del shard
-    gc.collect()
-    
-    # converts numbers to float32 to save memory and prevent crash
-    for col in rows.columns:
-        rows[col] = pd.to_numeric(rows[col], errors="coerce").astype(np.float32)
-
-    processed_chunks.append(rows)
-
-# Concatenate all processed chunks into a single DataFrame for training
-df = pd.concat(processed_chunks, ignore_index=True)
-del processed_chunks
+# Shards already in the feature store are memory-mapped; the others are extracted by a pool of
+# INGEST_WORKERS processes (streamed in batches, only RAW_COLS_NEEDED decoded, unlabeled rows dropped)
+# and come back in file order
+store = FeatureStore(FEATURE_STORE_DIR)
+shards = []
+for file_path, X_shard, y_shard in load_shards(store, jsonl_files, INGEST_WORKERS, INGEST_MAX_IN_FLIGHT,
+                                               SHARD_BATCH_SIZE):
+    print(f"Processed file: {file_path} ({len(y_shard):,} rows)")
+    shards.append((X_shard, y_shard))
 gc.collect()
+print(f"[*] Feature store: {store.hits} shards loaded, {store.misses} extracted")
 
-# SIMULATING 1MB TRUNCATION BY DROPPING IMPORTS AND EXPORTS
+# ─── TRAIN / VAL SPLIT ──────────────────────────────────────────────────────
+# Rows go to validation by a hash of their features (no shuffled copy of the corpus), and the
+# gateway truncation is simulated by zeroing imports / exports of IMPORT_DROPOUT_RATE of the rows
+# as LightGBM reads them
 print("Simulating gateway truncation (Dropout)...")
-imp_drop = np.random.rand(len(df)) < IMPORT_DROPOUT_RATE
-df.loc[imp_drop, ["imp_available", "imp_dll_count", "imp_func_count", "imp_has_gui_libs", "imp_has_crt"]] = 0
-
-exp_drop = np.random.rand(len(df)) < IMPORT_DROPOUT_RATE
-df.loc[exp_drop, ["exp_available", "exp_count"]] = 0
-
-
-# BUILD FEATURE MATRIX
-# Keep only columns that actually exist (safety net)
-feat_cols = [c for c in FEATURE_COLS if c in df.columns]
-
-X = df[feat_cols].values    # already float32 from the downcast above
-y = df["label"].values
-
-# Free the DataFrame 
-del df
-gc.collect()
+data = ShardedTrainingData(shards, val_fraction=VAL_FRACTION, seed=SEED, dropout_rate=IMPORT_DROPOUT_RATE)
+feat_cols = list(FEATURE_COLS)
 
-print(f"[*] Feature matrix: {X.shape[0]:,} samples × {X.shape[1]} features")
-print(f"[*] Class balance: {(y == 1).sum():,} malware / {(y == 0).sum():,} benign")
+y_train = data.train_labels()
+n_rows = sum(len(y_shard) for _, y_shard in shards)
+print(f"[*] Feature matrix: {n_rows:,} samples × {len(feat_cols)} features ({len(y_train):,} train)")
+print(f"[*] Class balance: {(y_train == 1).sum():,} malware / {(y_train == 0).sum():,} benign (train)")
 
+hard_cols = ["has_inno_sections", "imp_has_gui_libs", "dd_cert_present", "gen_has_signature"]
 
-# ─── 4. TRAIN / VAL SPLIT ───────────────────────────────────────────────────
-X_train, X_val, y_train, y_val = train_test_split(
-    X, y, test_size=0.15, stratify=y, random_state=SEED
-)
-del X, y
-gc.collect()
 
-train_weights = np.ones_like(y_train, dtype=np.float32)
-train_weights[y_train == 0] = BENIGN_WEIGHT
+def train_weights(X_rows, y_rows):
+    weights = np.ones_like(y_rows, dtype=np.float32)
+    weights[y_rows == 0] = BENIGN_WEIGHT
+    for col in hard_cols:
+        if col in feat_cols:
+            col_idx = feat_cols.index(col)
+            hard_mask = (y_rows == 0) & (X_rows[:, col_idx] > 0)
+            weights[hard_mask] *= HARD_BENIGN_WEIGHT
+    return weights
 
-hard_cols = ["has_inno_sections", "imp_has_gui_libs", "dd_cert_present", "gen_has_signature"]
-for col in hard_cols:
-    if col in feat_cols:
-        col_idx = feat_cols.index(col)
-        hard_mask = (y_train == 0) & (X_train[:, col_idx] > 0)
-        train_weights[hard_mask] *= HARD_BENIGN_WEIGHT
-
-train_set = lgb.Dataset(
-    X_train,
-    label=y_train,
-    weight=train_weights,
-    feature_name=feat_cols,
-    free_raw_data=True,
-)
-val_set   = lgb.Dataset(X_val,   label=y_val,   reference=train_set, free_raw_data=True)
 
-# TRAIN MODEL
 # Monotone constraints: imp_available and exp_available should only
 # INCREASE the malware score when set to 0 (missing data = more suspicious
 # is fine, but "has imports → definitely malware" is nonsensical).
@@ -141,6 +105,15 @@ params = {
     "seed": SEED,
 }
 
+# Built shard by shard from the memory-mapped store with LightGBM's sampled binning, and saved as a
+# LightGBM binary file that later runs load while the data, split, weights and params are unchanged
+train_set = data.train_dataset(train_weights, params, cache_dir=DATASET_CACHE_DIR)
+X_val, y_val = data.validation()
+val_set   = lgb.Dataset(X_val,   label=y_val,   reference=train_set, free_raw_data=True)
+del shards, y_train
+gc.collect()
+
+# TRAIN MODEL
 callbacks = [
     lgb.early_stopping(stopping_rounds=30),
     lgb.log_evaluation(period=25),
@@ -156,37 +129,22 @@ model = lgb.train(
     callbacks=callbacks,
 )
 
-del train_weights
-gc.collect()
-
 # EVALUATE
+# Exact operating points from one sort of the validation scores, instead of a coarse threshold sweep
 y_val_prob = model.predict(X_val)
-auc = roc_auc_score(y_val, y_val_prob)
-
-best_thresh = None
-best_recall = -1.0
-
-for thresh in [0.95, 0.90, 0.85, 0.80, 0.75, 0.70, 0.65, 0.60, 0.55, 0.50, 0.45, 0.40, 0.35, 0.30, 0.25, 0.20, 0.15, 0.10]:
-    y_pred = (y_val_prob >= thresh).astype(int)
-    tn, fp, fn, tp = confusion_matrix(y_val, y_pred, labels=[0, 1]).ravel()
-    acc    = accuracy_score(y_val, y_pred)
-    recall = tp / (tp + fn) if (tp + fn) else 0
-    fpr    = fp / (fp + tn) if (fp + tn) else 0
-    print(f"  thresh={thresh:.2f}  acc={acc:.4f}  recall={recall:.4f}  FPR={fpr:.4f}  TP={tp} FN={fn} FP={fp}")
-
-    if fpr <= TARGET_FPR and recall > best_recall:
-        best_recall = recall
-        best_thresh = thresh
-
-print(f"\n[*] Validation AUC: {auc:.5f}")
-
-if best_thresh is not None:
-    y_best = (y_val_prob >= best_thresh).astype(int)
-    tn, fp, fn, tp = confusion_matrix(y_val, y_best, labels=[0, 1]).ravel()
-    best_fpr = fp / (fp + tn) if (fp + tn) else 0
-    best_fnr = fn / (fn + tp) if (fn + tp) else 0
-    print(f"[*] Low-FPR threshold @ target={TARGET_FPR:.2f}: {best_thresh:.2f}")
-    print(f"[*] Low-FPR metrics -> FPR={best_fpr:.4f} FNR={best_fnr:.4f} TP={tp} FP={fp}")
+curve = OperatingCurve.from_scores(y_val, y_val_prob)
+
+for max_fpr in REPORT_FPRS:
+    point = curve.best_threshold(max_fpr)
+    if point is not None:
+        print(f"  FPR<={max_fpr:.3f}  {format_point(point)}")
+
+print(f"\n[*] Validation AUC: {curve.auc():.5f}")
+
+best = curve.best_threshold(TARGET_FPR)
+if best is not None:
+    print(f"[*] Low-FPR threshold @ target={TARGET_FPR:.2f}: {best['threshold']:.6f}")
+    print(f"[*] Low-FPR metrics -> FPR={best['fpr']:.4f} FNR={best['fnr']:.4f} TP={best['tp']} FP={best['fp']}")
 else:
     print(f"[*] No threshold met target FPR <= {TARGET_FPR:.2f} on validation.")
 
@@ -201,4 +159,7 @@ for name, score in feat_imp[:15]:
 model.save_model(MODEL_OUT)
 print(f"\n[+] Model saved → {MODEL_OUT}")
 print(f"    Features: {len(feat_cols)}")
-print(f"    Best iteration: {model.best_iteration}")
\ No newline at end of file
+print(f"    Best iteration: {model.best_iteration}")
+
+build_artifact(MODEL_OUT)
+print(f"[+] Compiled artifact → {MODEL_OUT}.compiled")
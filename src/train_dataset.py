@@ -0,0 +1,167 @@
+'''
+Out-of-core LightGBM training data. The per-shard matrices of the FeatureStore are handed to
+lgb.Dataset as lgb.Sequence objects: LightGBM samples bin_construct_sample_cnt rows to build the
+feature bins and then pushes each shard through in batches, so the corpus is never concatenated
+into one DataFrame. Rows are assigned to the validation split by a hash of their feature values
+instead of a shuffled copy, and the binned training Dataset is saved as a LightGBM binary file
+keyed by everything that went into it, for reuse by the next run.
+
+    data = ShardedTrainingData([(X, y) for _, X, y in load_shards(store, paths)])
+    train_set = data.train_dataset(weight_fn, params, cache_dir="datasets")
+    X_val, y_val = data.validation()
+'''
+import os
+import json
+import hashlib
+
+import numpy as np
+import lightgbm as lgb
+
+from config import FEATURE_COLS, SEED, IMPORT_DROPOUT_RATE
+
+# Columns zeroed to simulate the gateway's 1MB truncation dropping the import / export tables
+IMP_DROP_COLS = ["imp_available", "imp_dll_count", "imp_func_count", "imp_has_gui_libs", "imp_has_crt"]
+EXP_DROP_COLS = ["exp_available", "exp_count"]
+HASH_CHUNK_ROWS = 65536
+
+
+def row_hash(X, seed=SEED):
+    """Deterministic uint64 hash of every row of a float32 matrix, from the bit patterns of its values.
+    Rows with identical features hash the same, so duplicates never straddle the split"""
+    X = np.asarray(X, dtype=np.float32)
+    mult = np.random.default_rng(seed).integers(1, 2 ** 63, size=X.shape[1], dtype=np.uint64) | np.uint64(1)
+    out = np.empty(len(X), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for start in range(0, len(X), HASH_CHUNK_ROWS):
+            bits = np.ascontiguousarray(X[start:start + HASH_CHUNK_ROWS]).view(np.uint32).astype(np.uint64)
+            h = (bits * mult).sum(axis=1, dtype=np.uint64)
+            # splitmix64 finalizer
+            h ^= h >> np.uint64(30)
+            h *= np.uint64(0xBF58476D1CE4E5B9)
+            h ^= h >> np.uint64(27)
+            h *= np.uint64(0x94D049BB133111EB)
+            h ^= h >> np.uint64(31)
+            out[start:start + HASH_CHUNK_ROWS] = h
+    return out
+
+
+def validation_mask(hashes, fraction):
+    """Rows whose hash, read as a uniform number in [0, 1), falls under fraction"""
+    return (hashes >> np.uint64(11)).astype(np.float64) * 2.0 ** -53 < fraction
+
+
+class ShardRows(lgb.Sequence):
+    """A subset of the rows of one shard matrix, with the import / export dropout applied as rows
+    are read"""
+
+    def __init__(self, X, rows, drop, batch_size=lgb.Sequence.batch_size):
+        self.X = X
+        self.rows = rows
+        # drop[i] = (zero the import columns, zero the export columns) of row rows[i]
+        self.drop = drop
+        self.batch_size = batch_size
+        self._imp = [FEATURE_COLS.index(c) for c in IMP_DROP_COLS]
+        self._exp = [FEATURE_COLS.index(c) for c in EXP_DROP_COLS]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            idx = np.arange(*idx.indices(len(self.rows)))
+        elif isinstance(idx, list):
+            idx = np.asarray(idx)
+        if np.ndim(idx) == 0:
+            # single rows are LightGBM's bin construction sample, which it wants as float64
+            return self[np.array([idx])][0].astype(np.float64)
+        out = np.array(self.X[self.rows[idx]], dtype=np.float32)
+        drop = self.drop[idx]
+        out[np.ix_(drop[:, 0], self._imp)] = 0
+        out[np.ix_(drop[:, 1], self._exp)] = 0
+        return out
+
+
+class ShardedTrainingData:
+    """
+    Train / validation split over a list of (X, y) shard matrices (memmaps from the FeatureStore
+    work best). Every row goes to validation when its row_hash falls under val_fraction, and the
+    import / export columns of dropout_rate of the rows are zeroed, like train.py always did.
+    """
+
+    def __init__(self, shards, val_fraction=0.15, seed=SEED, dropout_rate=IMPORT_DROPOUT_RATE):
+        self.shards = []  # (X, y, train rows, val rows, dropout flags)
+        self.val_fraction = val_fraction
+        self.seed = seed
+        self.dropout_rate = dropout_rate
+        rng = np.random.default_rng(seed)
+        digest = hashlib.sha256()
+        for X, y in shards:
+            hashes = row_hash(X, seed)
+            digest.update(hashes.tobytes())
+            val = validation_mask(hashes, val_fraction)
+            drop = rng.random((len(X), 2)) < dropout_rate
+            self.shards.append((X, np.asarray(y), np.flatnonzero(~val), np.flatnonzero(val), drop))
+        self.content_hash = digest.hexdigest()
+
+    def _labels(self, part):
+        if not self.shards:
+            return np.zeros(0, dtype=np.float32)
+        return np.concatenate([y[split[part]] for X, y, *split, _ in self.shards]).astype(np.float32)
+
+    def train_labels(self):
+        return self._labels(0)
+
+    def sequences(self, part=0):
+        """ShardRows of the training (part=0) or validation (part=1) rows of every shard"""
+        return [ShardRows(X, split[part], drop[split[part]]) for X, y, *split, drop in self.shards]
+
+    def train_weights(self, weight_fn):
+        """weight_fn(X, y) -> per-row weights, run shard by shard over the (dropped out) training rows"""
+        weights = [np.asarray(weight_fn(seq[0:len(seq)], y[seq.rows]), dtype=np.float32)
+                   for seq, (X, y, *_) in zip(self.sequences(0), self.shards)]
+        return np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32)
+
+    def validation(self):
+        """(X_val, y_val) in memory; the validation split is val_fraction of the corpus"""
+        parts = [seq[0:len(seq)] for seq in self.sequences(1)]
+        X_val = np.concatenate(parts) if parts else np.zeros((0, len(FEATURE_COLS)), dtype=np.float32)
+        return X_val, self._labels(1)
+
+    def dataset_key(self, params, weights):
+        """Hash of the shard contents, the split, the weights and the Dataset parameters"""
+        spec = {
+            "content": self.content_hash,
+            "feature_cols": FEATURE_COLS,
+            "val_fraction": self.val_fraction,
+            "seed": self.seed,
+            "dropout_rate": self.dropout_rate,
+            "weights": hashlib.sha256(weights.tobytes()).hexdigest(),
+            "params": params,
+            "lightgbm": lgb.__version__,
+        }
+        return hashlib.sha256(json.dumps(spec, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+    def train_dataset(self, weight_fn=None, params=None, cache_dir=None):
+        """
+        Constructed lgb.Dataset of the training rows. With cache_dir the binned Dataset is saved
+        there as a LightGBM binary file and loaded instead of rebuilt while nothing that went
+        into it has changed. params must be the training params (they decide the binning).
+        """
+        params = dict(params or {})
+        labels = self.train_labels()
+        weights = self.train_weights(weight_fn) if weight_fn else np.ones(len(labels), dtype=np.float32)
+        path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            path = os.path.join(cache_dir, f"train-{self.dataset_key(params, weights)}.bin")
+            if os.path.exists(path):
+                print(f"[*] Loading binned training set: {path}")
+                return lgb.Dataset(path, params=params, feature_name=list(FEATURE_COLS)).construct()
+
+        train_set = lgb.Dataset(self.sequences(0), label=labels, weight=weights, params=params,
+                                feature_name=list(FEATURE_COLS), free_raw_data=True).construct()
+        if path:
+            train_set.save_binary(path + ".tmp")
+            os.replace(path + ".tmp", path)
+            print(f"[*] Saved binned training set: {path}")
+        return train_set
@@ -0,0 +1,241 @@
+'''
+Compiles LightGBM text models into flat NumPy arrays and scores them without the LightGBM
+runtime. All trees are laid out in one set of node arrays (split feature, threshold, missing-value
+handling, children) and a batch is pushed through every tree at once, one tree level per step,
+with NumPy gathers. Tree outputs are summed in tree order in float64 like LightGBM, so raw scores
+match Booster.predict exactly and probabilities to float rounding of exp().
+
+    model = CompiledModel.from_text("ember_lite_model_2024.txt")
+    model.save("ember_lite_model_2024.npz")          # loads much faster than the text model
+    probs = CompiledModel.load("ember_lite_model_2024.npz").predict(X)
+'''
+import numpy as np
+
+# LightGBM decision_type bits
+CATEGORICAL_MASK = 1
+DEFAULT_LEFT_MASK = 2
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+LEAF_CHUNK_ROWS = 1024
+ZERO_THRESHOLD = float(np.float32(1e-35))  # kZeroThreshold, a float literal in LightGBM
+
+ARRAY_FIELDS = ["feature", "threshold", "default_left", "missing_type", "left", "right", "leaf_value",
+                "roots", "monotone_constraints"]
+
+
+def _parse_blocks(path):
+    """(header dict, [tree dicts]) of a LightGBM text model"""
+    header, trees = {}, []
+    current = header
+    with open(path, encoding="utf8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("Tree="):
+                current = {}
+                trees.append(current)
+            elif line in ("end of trees", "feature_importances:", "parameters:"):
+                break
+            elif "=" in line:
+                key, value = line.split("=", 1)
+                current[key] = value
+    return header, trees
+
+
+def _numbers(block, key, dtype):
+    return np.array(block[key].split(), dtype=dtype) if block.get(key) else np.zeros(0, dtype=dtype)
+
+
+class CompiledModel:
+    """
+    Flattened tree ensemble. Internal nodes of all trees share one index space; a child < 0 is
+    the leaf ~child in leaf_value. roots holds each tree's root (a leaf for single-leaf trees).
+    """
+
+    def __init__(self, feature, threshold, default_left, missing_type, left, right, leaf_value, roots,
+                 monotone_constraints, feature_names, objective, sigmoid=1.0, average_output=False):
+        self.feature = feature
+        self.threshold = threshold
+        self.default_left = default_left
+        self.missing_type = missing_type
+        self.left = left
+        self.right = right
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.monotone_constraints = monotone_constraints
+        self.feature_names = list(feature_names)
+        self.objective = objective
+        self.sigmoid = sigmoid
+        self.average_output = average_output
+        # built by the first leaves() call, so a memory-mapped model isn't read when it's loaded
+        self._tables = None
+
+    def _node_tables(self):
+        """(children, nan_nodes, zero_nodes): children[2 * i] is the right and children[2 * i + 1]
+        the left child of node i; the masks mark the nodes sending NaN / zero the default way"""
+        if self._tables is None:
+            self._tables = (np.stack([self.right, self.left], axis=1).ravel(),
+                            self.missing_type == MISSING_NAN, self.missing_type == MISSING_ZERO)
+        return self._tables
+
+    @property
+    def num_trees(self):
+        return len(self.roots)
+
+    @property
+    def num_features(self):
+        return len(self.feature_names)
+
+    @classmethod
+    def from_text(cls, path):
+        """Compiles a model saved by Booster.save_model()"""
+        header, trees = _parse_blocks(path)
+        if int(header.get("num_class", 1)) != 1 or int(header.get("num_tree_per_iteration", 1)) != 1:
+            raise ValueError("Only single-output models (binary / regression) can be compiled")
+        objective = header.get("objective", "regression").split()
+        sigmoid = 1.0
+        for option in objective[1:]:
+            if option.startswith("sigmoid:"):
+                sigmoid = float(option.split(":", 1)[1])
+
+        feature, threshold, decision, left, right, leaf_value, roots = [], [], [], [], [], [], []
+        node_offset = leaf_offset = 0
+        for i, tree in enumerate(trees):
+            if tree.get("is_linear", "0") != "0":
+                raise ValueError(f"Tree {i} is a linear tree, which can't be compiled")
+            if int(tree.get("num_cat", 0)):
+                raise ValueError(f"Tree {i} has categorical splits, which can't be compiled")
+            num_leaves = int(tree["num_leaves"])
+            values = _numbers(tree, "leaf_value", np.float64)
+            leaf_value.append(values)
+            if num_leaves == 1:
+                roots.append(~leaf_offset)
+            else:
+                roots.append(node_offset)
+                children = []
+                for key in ("left_child", "right_child"):
+                    c = _numbers(tree, key, np.int64)
+                    # internal children move to the shared index space, leaves to the shared leaf space
+                    children.append(np.where(c >= 0, c + node_offset, c - leaf_offset))
+                left.append(children[0])
+                right.append(children[1])
+                feature.append(_numbers(tree, "split_feature", np.int32))
+                threshold.append(_numbers(tree, "threshold", np.float64))
+                decision.append(_numbers(tree, "decision_type", np.int8))
+                node_offset += num_leaves - 1
+            leaf_offset += num_leaves
+
+        def cat(parts, dtype):
+            return np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+
+        decision = cat(decision, np.int8)
+        feature_names = header.get("feature_names", "").split()
+        monotone = _numbers(header, "monotone_constraints", np.int8)
+        return cls(
+            feature=cat(feature, np.int32),
+            threshold=cat(threshold, np.float64),
+            default_left=(decision & DEFAULT_LEFT_MASK) != 0,
+            missing_type=((decision >> 2) & 3).astype(np.int8),
+            left=cat(left, np.int64),
+            right=cat(right, np.int64),
+            leaf_value=cat(leaf_value, np.float64),
+            roots=np.array(roots, dtype=np.int64),
+            monotone_constraints=monotone if len(monotone) else np.zeros(len(feature_names), dtype=np.int8),
+            feature_names=feature_names,
+            objective=objective[0] if objective else "regression",
+            sigmoid=sigmoid,
+            average_output="average_output" in header,
+        )
+
+    @classmethod
+    def merge(cls, models, feature_maps, feature_names):
+        """
+        One model holding the trees of every model, in order, for scoring them all in one pass:
+        feature j of models[i] is read from column feature_maps[i][j] of feature_names. Its own
+        predict() sums all trees; to score the models apart, sum each model's columns of leaves()
+        and apply that model's transform().
+        """
+        node_offset = leaf_offset = 0
+        parts = {name: [] for name in ARRAY_FIELDS if name != "monotone_constraints"}
+        for model, feature_map in zip(models, feature_maps):
+            shift = lambda c: np.where(c >= 0, c + node_offset, c - leaf_offset)
+            parts["feature"].append(np.asarray(feature_map, dtype=np.int32)[model.feature])
+            parts["left"].append(shift(model.left))
+            parts["right"].append(shift(model.right))
+            parts["roots"].append(shift(model.roots))
+            for name in ("threshold", "default_left", "missing_type", "leaf_value"):
+                parts[name].append(getattr(model, name))
+            node_offset += len(model.feature)
+            leaf_offset += len(model.leaf_value)
+        merged = {name: np.concatenate(values) for name, values in parts.items()}
+        return cls(**merged, monotone_constraints=np.zeros(len(feature_names), dtype=np.int8),
+                   feature_names=feature_names, objective="regression")
+
+    def save(self, path):
+        np.savez(path, **{name: getattr(self, name) for name in ARRAY_FIELDS},
+                 feature_names=np.array(self.feature_names), objective=np.array(self.objective),
+                 sigmoid=np.array(self.sigmoid), average_output=np.array(self.average_output))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as z:
+            arrays = {name: z[name] for name in ARRAY_FIELDS}
+            return cls(**arrays, feature_names=z["feature_names"].tolist(), objective=str(z["objective"]),
+                       sigmoid=float(z["sigmoid"]), average_output=bool(z["average_output"]))
+
+    def leaves(self, X):
+        """(n_rows, num_trees) leaf index reached in every tree"""
+        X = np.array(X, dtype=np.float64, ndmin=2)
+        if X.shape[1] != self.num_features:
+            raise ValueError(f"The model expects {self.num_features} features, got {X.shape[1]}")
+        # LightGBM's predictor drops values within ZERO_THRESHOLD of zero (they read as 0.0), and
+        # reads NaN as 0 unless the split sends missing values a specific way
+        X[np.abs(X) <= ZERO_THRESHOLD] = 0.0
+        children, nan_nodes, zero_nodes = self._node_tables()
+        nan = np.isnan(X)
+        has_nan = nan.any() and nan_nodes.any()
+        X_zero = np.where(nan, 0.0, X)
+        has_zero = zero_nodes.any()
+
+        n, d = X.shape
+        out = np.empty(n * self.num_trees, dtype=np.int64)
+        for start in range(0, n, LEAF_CHUNK_ROWS):
+            values = X_zero[start:start + LEAF_CHUNK_ROWS].ravel()
+            missing = nan[start:start + LEAF_CHUNK_ROWS].ravel()
+            rows = len(values) // d
+            # one entry per (row, tree) still inside the tree: current node, output slot, row offset
+            node = np.tile(self.roots, rows)
+            slot = np.arange(start * self.num_trees, (start + rows) * self.num_trees)
+            base = np.repeat(np.arange(rows) * d, self.num_trees)
+            while len(node):
+                done = node < 0
+                if done.any():
+                    out[slot[done]] = ~node[done]
+                    keep = ~done
+                    node, slot, base = node[keep], slot[keep], base[keep]
+                    if not len(node):
+                        break
+                pos = base + self.feature[node]
+                value = values[pos]
+                go_left = value <= self.threshold[node]
+                if has_zero:
+                    default = zero_nodes[node] & (value == 0.0)
+                    go_left[default] = self.default_left[node[default]]
+                if has_nan:
+                    default = nan_nodes[node] & missing[pos]
+                    go_left[default] = self.default_left[node[default]]
+                node = children[2 * node + go_left]
+        return out.reshape(n, self.num_trees)
+
+    def predict(self, X, raw_score=False):
+        """Scores like Booster.predict(X) (raw_score: before the sigmoid)"""
+        values = self.leaf_value[self.leaves(X)]
+        # sequential sum in tree order, as LightGBM accumulates
+        raw = np.cumsum(values, axis=1)[:, -1] if self.num_trees else np.zeros(len(values))
+        return self.transform(raw, raw_score)
+
+    def transform(self, raw, raw_score=False):
+        """Model output from the sum of the tree outputs"""
+        if self.average_output and self.num_trees:
+            raw = raw / self.num_trees
+        if raw_score or self.objective != "binary":
+            return raw
+        return 1.0 / (1.0 + np.exp(-self.sigmoid * raw))